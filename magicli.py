@@ -4,13 +4,22 @@ by introspecting its functions and automatically parsing command-
 line arguments based on function signatures.
 """
 
+import gc
 import importlib
+import importlib.util
 import inspect
 import logging
 import os
+import signal
+import struct
 import subprocess
 import sys
-from functools import partial
+import time
+import traceback
+import zlib
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager, nullcontext, redirect_stdout
+from functools import lru_cache, partial
 from importlib import metadata
 from pathlib import Path
 
@@ -18,32 +27,122 @@ logging.basicConfig(level=os.getenv("MAGICLI_LOG_LEVEL", "DEBUG"), format="%(mes
 logger = logging.getLogger(__name__)
 
 
+PIPE = ":::"
+
+
 class ParseArgvError(Exception):
     """Failure to parse argv into args and kwargs based on function parameters and docstring."""
 
 
+class TimeLimitExceeded(BaseException):
+    """Raised by the alarm handler of `--magicli-timeout` to cancel the running function."""
+
+
 def magicli():
     """Parses command-line arguments and calls the appropriate function."""
     name = Path(sys.argv[0]).name
     argv = sys.argv[1:]
 
     if name == "magicli":
+        if argv and (command := MAGICLI_COMMANDS.get(argv[0])):
+            raise SystemExit(call(command, argv[1:], sys.modules["magicli"], name))
         raise SystemExit(call(cli, argv, sys.modules["magicli"]))
 
+    if pop_flag(argv, "--magicli-metrics") or os.getenv("MAGICLI_METRICS"):
+        with record_metrics(name) as metrics:
+            run_cli(name, argv, metrics)
+    else:
+        run_cli(name, argv)
+
+
+def run_cli(name, argv, metrics=None):
+    """Imports the module of a CLI and calls the function selected by argv."""
+    if replay_cached(name, argv):
+        return
+
+    start = time.perf_counter()
     module = load_module(name)
+    if metrics is not None:
+        metrics["import"] = time.perf_counter() - start
+        metrics["version"] = get_version(module) or ""
+
+    if pop_flag(argv, "--magicli-watch"):
+        raise SystemExit(watch(module, argv, name.replace("-", "_")))
+    if pop_flag(argv, "--magicli-shell"):
+        timing = pop_flag(argv, "--magicli-timing")
+        raise SystemExit(shell(module, name.replace("-", "_"), timing))
+
+    dispatch(argv, module, name.replace("-", "_"), metrics)
+
+
+def dispatch(argv, module, name, metrics=None):
+    """Calls the function or pipeline of functions selected by argv."""
+    if PIPE in argv:
+        return pipeline(argv, module, name, metrics)
+    if command := get_function_from_argv(argv, module, name):
+        return run_command(command, metrics)
+    error = None
+    if argv and not argv[0].startswith("-"):
+        error = suggest_command(f"{argv[0]}: unknown command", argv, module)
+    raise SystemExit(help_message(help_from_module, module, error=error))
 
-    if function := get_function_from_argv(argv, module, name.replace("-", "_")):
-        function()
-    else:
-        raise SystemExit(help_message(help_from_module, module))
+
+def pipeline(argv, module, name, metrics=None):
+    """
+    Calls the commands separated by ':::' in one process. The return value of
+    each command, including lazy generators, is passed as the first positional
+    argument to the next command. Only the result of the last command is printed.
+    """
+    stages = [[]]
+    for arg in argv:
+        if arg == PIPE:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+
+    result = inspect.Parameter.empty
+    for stage in stages:
+        if not (command := get_function_from_argv(stage, module, name)):
+            raise SystemExit(help_message(help_from_module, module))
+        result = run_command(command, metrics, piped=result)
+
+    if isinstance(result, Iterator):
+        for item in result:
+            print(item)
+    elif result is not None:
+        print(result)
+
+
+def run_command(command, metrics=None, piped=inspect.Parameter.empty):
+    """
+    Parses the arguments of a command returned by `get_function_from_argv`
+    and runs it. The parse time and command name are added to `metrics`.
+    """
+    start = time.perf_counter()
+    function = command(piped=piped)
+    if metrics is not None:
+        metrics["parse"] += time.perf_counter() - start
+        metrics["commands"].append(command.args[0].__name__)
+    return function()
+
+
+def pop_flag(argv, flag):
+    """Removes a magicli flag from argv and returns whether it was present."""
+    if flag in argv:
+        argv.remove(flag)
+        return True
+    return False
 
 
 def get_function_from_argv(argv, module, name):
-    """Returns the module's function to call based on argv."""
+    """
+    Returns the module's function to call based on argv, as a partial of
+    `prepare_call` that parses the rest of argv.
+    """
     if function := is_command(argv, module):
-        return partial(call, function, argv[1:], module, name)
+        return partial(prepare_call, function, argv[1:], module, name)
     if inspect.isfunction(function := getattr(module, name, None)):
-        return partial(call, function, argv, module)
+        return partial(prepare_call, function, argv, module)
     return None
 
 
@@ -51,39 +150,946 @@ def is_command(argv, module):
     """
     Checks if the first argument is a valid command in the module and returns
     the function to call if `argv[0]` is public and not excluded in `__all__`.
+    Falls back to plugin commands, which are only imported when they are called,
+    and to the command that `argv[0]` is an unambiguous prefix of, unless the
+    module has a default function that could take `argv[0]` as argument.
     """
+    if not argv or (command := argv[0].replace("-", "_")).startswith("_"):
+        return None
+    if function := get_command(module, command):
+        return function
     if (
-        argv
-        and not (command := argv[0].replace("-", "_")).startswith("_")
-        and command in getattr(module, "__all__", [command])
-        and inspect.isfunction(function := getattr(module, command, None))
+        not os.getenv("MAGICLI_STRICT")
+        and not has_default_function(module)
+        and (command := complete(get_command_trie(module), command))
+    ):
+        return get_command(module, command)
+    return None
+
+
+def get_command(module, command):
+    """
+    Returns the function of a command by its exact name. Plugin commands are
+    only looked up if the module has no default function.
+    """
+    if command in getattr(module, "__all__", [command]) and inspect.isfunction(
+        function := getattr(module, command, None)
     ):
         return function
+    if not has_default_function(module) and (
+        value := get_plugins(module.__name__).get(command)
+    ):
+        return metadata.EntryPoint(command, value, f"{module.__name__}.commands").load()
     return None
 
 
-def call(function, argv, module=None, name=None):
+def has_default_function(module):
+    """Checks if the module has a function named after it, which runs without a command."""
+    return inspect.isfunction(getattr(module, module.__name__, None))
+
+
+@lru_cache(maxsize=None)
+def get_plugins(name):
+    """
+    Returns the commands that installed packages add to a CLI through the entry
+    point group `<name>.commands`, mapped to their 'module:function' values.
+    The index is cached and only rebuilt when the installed distributions change.
+    """
+    import json  # pylint: disable=import-outside-toplevel
+
+    path = get_cache_dir("plugins", f"{name}.json")
+    stamp = get_site_stamp()
+    try:
+        if (index := json.loads(path.read_text(encoding="utf-8")))["stamp"] == stamp:
+            return index["commands"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    commands = {
+        entry_point.name.replace("-", "_"): entry_point.value
+        for entry_point in metadata.entry_points(group=f"{name}.commands")
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, json.dumps({"stamp": stamp, "commands": commands}).encode())
+    except OSError:
+        pass
+    return commands
+
+
+def get_site_stamp():
+    """
+    Returns the modification times of the directories on `sys.path`, which
+    change whenever a distribution is installed or removed.
+    """
+    return [
+        [path, os.stat(path).st_mtime_ns] for path in sys.path if os.path.isdir(path)
+    ]
+
+
+@lru_cache(maxsize=None)
+def get_command_trie(module):
+    """
+    Returns the trie of the module's commands. It is only built when an exact
+    lookup fails and is cleared when the module is reloaded.
+    """
+    return build_trie(tuple(get_commands(module)))
+
+
+@lru_cache(maxsize=256)
+def build_trie(names):
+    """
+    Builds a trie of nested dicts with one level per character.
+    The key '' of a node holds the name that ends there.
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[""] = name
+    return trie
+
+
+def complete(trie, prefix):
+    """Returns the only name in the trie that starts with `prefix`, otherwise None."""
+    names = find_prefixed(trie, prefix, limit=2)
+    return names[0] if len(names) == 1 else None
+
+
+def find_prefixed(trie, prefix, limit):
+    """Returns up to `limit` names in the trie that start with `prefix`."""
+    node = trie
+    for char in prefix:
+        if (node := node.get(char)) is None:
+            return []
+    names = []
+    stack = [node]
+    while stack and len(names) < limit:
+        node = stack.pop()
+        names.extend(child for char, child in node.items() if not char)
+        stack.extend(child for char, child in node.items() if char)
+    return sorted(names[:limit])
+
+
+def find_similar(trie, word, max_distance):
+    """
+    Returns the names in the trie within the Levenshtein distance `max_distance`
+    of `word`, closest first. Subtrees are skipped as soon as every prefix in
+    them is further away than `max_distance`.
+    """
+    matches = []
+    stack = [(trie, range(len(word) + 1))]
+    while stack:
+        node, row = stack.pop()
+        if (name := node.get("")) is not None and row[-1] <= max_distance:
+            matches.append((row[-1], name))
+        for char, child in node.items():
+            if not char:
+                continue
+            next_row = [row[0] + 1]
+            for i, letter in enumerate(word, 1):
+                next_row.append(
+                    min(next_row[i - 1] + 1, row[i] + 1, row[i - 1] + (letter != char))
+                )
+            if min(next_row) <= max_distance:
+                stack.append((child, next_row))
+    return [name for _, name in sorted(matches)]
+
+
+def did_you_mean(trie, word, prefix=""):
+    """
+    Formats up to three names that start with or are similar to an unknown
+    `word` as suffix of an error message.
+    """
+    max_distance = 1 if len(word) < 5 else 2
+    names = find_prefixed(trie, word, limit=3)
+    names += [
+        name for name in find_similar(trie, word, max_distance) if name not in names
+    ]
+    if not (names := names[:3]):
+        return ""
+    names = [prefix + name.replace("_", "-") for name in names]
+    return ", did you mean " + " or ".join(names) + "?"
+
+
+def suggest_command(error, argv, module):
+    """
+    Adds similar commands to the error of an unknown first positional
+    argument of a module's default function, which is likely a typo.
+    """
+    if module and argv and error == f"{argv[0]}: unknown command":
+        error += did_you_mean(get_command_trie(module), argv[0].replace("-", "_"))
+    return error
+
+
+def call(function, argv, module=None, name=None, piped=inspect.Parameter.empty):
     """
     Converts arguments to function parameters and calls the function.
+    A `piped` value is passed as the first positional argument.
     Displays a help message if an exception occurs.
     """
+    return prepare_call(function, argv, module, name, piped)()
+
+
+def prepare_call(function, argv, module=None, name=None, piped=inspect.Parameter.empty):
+    """
+    Converts arguments to function parameters and returns a function without
+    arguments that calls the function with the enabled magicli options.
+    """
     docstring = inspect.getdoc(function) or ""
     parameters = inspect.signature(function).parameters
-
-    check_for_help_and_version(argv, parameters, docstring, module, function)
+    raw_argv = [function.__name__, *argv] if name else argv
 
     try:
-        args, kwargs = parse_argv(argv, parameters, docstring)
+        argv, options = split_magicli_options(argv)
+        check_for_help_and_version(argv, parameters, docstring, module, function)
+        if piped is not inspect.Parameter.empty:
+            parameters, piped_parameter = pop_parameter(
+                parameters,
+                next(iter(parameters), None),
+                f"{function.__name__}: takes no piped input",
+            )
+        if "map" in options:
+            parameters, options["map"] = pop_parameter(
+                parameters,
+                options["map"].replace("-", "_"),
+                f"{options['map']}: unknown parameter to map",
+            )
+        args, kwargs = parse_argv(
+            argv, parameters, docstring, require_all="ndjson" not in options
+        )
+        find_variadic(parameters, options)
+        if module and module.__name__ != __name__:
+            apply_defaults(module, function, parameters, args, kwargs)
     except ParseArgvError as exc:
+        error = suggest_command(exc.args[0], argv, module) if not name else exc.args[0]
         raise SystemExit(
-            help_message(help_from_function, function, name, module, error=exc.args[0])
+            help_message(help_from_function, function, name, module, error=error)
         )
 
-    function(*args, **kwargs)
+    if piped is not inspect.Parameter.empty:
+        args, kwargs = insert_argument(args, kwargs, piped_parameter, 0, piped)
+    if options.get("cache") or hasattr(function, "__magicli_cache__"):
+        options["cache"] = (module, raw_argv)
+    if not options:
+        return partial(function, *args, **kwargs)
+    return partial(run_with_options, function, args, kwargs, options)
+
+
+def pop_parameter(parameters, name, error):
+    """
+    Returns a copy of the parameters without the parameter `name` and the
+    removed parameter, which gets its value from elsewhere than argv.
+    """
+    parameters = dict(parameters)
+    if (parameter := parameters.pop(name, None)) is None:
+        raise ParseArgvError(error)
+    return parameters, parameter
+
+
+def insert_argument(args, kwargs, parameter, index, value):
+    """
+    Returns args and kwargs with the value of a parameter at `index` that is
+    not parsed from argv. The value is passed by position if the positional
+    arguments reach the parameter, otherwise by keyword.
+    """
+    if parameter.kind is not parameter.KEYWORD_ONLY and index <= len(args):
+        return [*args[:index], value, *args[index:]], kwargs
+    return args, {**kwargs, parameter.name: value}
+
+
+def split_magicli_options(argv):
+    """
+    Separates `--magicli-*` options from the arguments of the function.
+    Options without a type are flags that accept an optional value after '='.
+    """
+    if not any(arg.startswith("--magicli-") for arg in argv):
+        return argv, {}
+
+    rest, options = [], {}
+    for arg in (iter_argv := iter(argv)):
+        if not arg.startswith("--magicli-"):
+            rest.append(arg)
+            continue
+        key, value = arg.split("=", 1) if "=" in arg else (arg, None)
+        if (option := key[10:].replace("-", "_")) not in MAGICLI_OPTIONS:
+            raise ParseArgvError(f"{key}: unknown magicli option")
+        cast_to = MAGICLI_OPTIONS[option][0]
+        if cast_to is None:
+            options[option] = True if value is None else value
+        else:
+            options[option] = cast_value(
+                next_arg(iter_argv) if value is None else value, cast_to
+            )
+    return rest, options
+
+
+def run_with_options(function, args, kwargs, options):
+    """
+    Calls the function inside the contexts enabled by magicli options.
+    The first option with a runner calls the function instead.
+    """
+    runner = None
+    with ExitStack() as stack:
+        for option, (_, context, option_runner) in MAGICLI_OPTIONS.items():
+            if option not in options:
+                continue
+            if context:
+                stack.enter_context(context(options[option]))
+            runner = runner or option_runner
+        if runner:
+            return runner(function, args, kwargs, options)
+        return function(*args, **kwargs)
+
+
+def map_records(function, args, kwargs, options):
+    """
+    Calls the function once per stdin record, bound to the parameter of `--magicli-map`.
+    Flushes stdout every `--magicli-flush` records to stream the output.
+    """
+    parameter = options["map"]
+    position = list(inspect.signature(function).parameters).index(parameter.name)
+    with open_checkpoint(function, args, kwargs, options) as checkpoint:
+        for count, (index, record) in enumerate(
+            select_items(
+                read_records(sys.stdin, "\0" if options.get("null") else "\n"),
+                options,
+                checkpoint,
+            ),
+            1,
+        ):
+            try:
+                value = cast_value(record, get_type(parameter))
+            except ParseArgvError as exc:
+                raise SystemExit(
+                    f"{record}: {exc.args[0] if exc.args else 'invalid value'}"
+                )
+            call_args, call_kwargs = insert_argument(
+                args, kwargs, parameter, position, value
+            )
+            function(*call_args, **call_kwargs)
+            if checkpoint:
+                checkpoint.add(index)
+            flush_records(count, options)
+
+
+def flush_records(count, options):
+    """Flushes stdout after every `--magicli-flush` records to stream the output."""
+    if (flush := options.get("flush", 1)) and count % flush == 0:
+        sys.stdout.flush()
+
+
+def read_records(stream, delimiter="\n", size=1 << 16):
+    """Yields delimited records from a text stream without reading it all at once."""
+    if delimiter == "\n":
+        yield from (line.removesuffix("\n") for line in stream)
+        return
+    rest = ""
+    while chunk := stream.read(size):
+        *records, rest = (rest + chunk).split(delimiter)
+        yield from records
+    if rest:
+        yield rest
+
+
+def map_ndjson(function, args, kwargs, options):
+    """
+    Calls the function once per JSON object from stdin or a file, using its keys
+    as keyword arguments, and writes each result or error as a JSON line.
+    """
+    parameters = get_unbound_parameters(function, args)
+    loads, dumps = get_json_codec()
+    with (
+        nullcontext(sys.stdin)
+        if options["ndjson"] is True
+        else open(options["ndjson"], encoding="utf-8") as stream,
+        open_checkpoint(function, args, kwargs, options) as checkpoint,
+    ):
+        for count, (index, line) in enumerate(
+            select_items(filter(str.strip, read_records(stream)), options, checkpoint),
+            1,
+        ):
+            try:
+                record = {
+                    "result": function(
+                        *args, **bind_record(loads(line), parameters, kwargs)
+                    )
+                }
+                if checkpoint:
+                    checkpoint.add(index)
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                record = {"error": f"{type(exc).__name__}: {exc}"}
+            sys.stdout.write(dumps(record) + "\n")
+            flush_records(count, options)
+
+
+def get_unbound_parameters(function, args):
+    """Returns the parameters of a function that the positional args do not bind."""
+    signature = inspect.signature(function)
+    bound = signature.bind_partial(*args).arguments
+    return {
+        name: parameter
+        for name, parameter in signature.parameters.items()
+        if name not in bound
+    }
+
+
+def bind_record(record, parameters, kwargs):
+    """Casts the values of a JSON object to the types of the function's parameters."""
+    if not isinstance(record, dict):
+        raise ParseArgvError("record is not a JSON object")
+    kwargs = dict(kwargs)
+    for key, value in record.items():
+        if (parameter := parameters.get(key)) is None:
+            raise ParseArgvError(f"{key}: unknown parameter")
+        kwargs[key] = cast_json(value, get_type(parameter))
+    for parameter in parameters.values():
+        if (
+            parameter.name not in kwargs
+            and parameter.default is parameter.empty
+            and parameter.kind not in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD)
+        ):
+            raise ParseArgvError(f"{parameter.name}: positional argument missing")
+    return kwargs
+
+
+def cast_json(value, cast_to):
+    """
+    Keeps JSON values that already have the right type and casts the others.
+    Numbers are converted for `str` parameters and integral floats for `int`
+    parameters, mismatched values are rejected.
+    """
+    if cast_to is type(None):
+        return value
+    check_json_type(value, cast_to)
+    if cast_to in (str, int) and isinstance(value, (int, float)):
+        return cast_to(value)
+    try:
+        if isinstance(value, cast_to):
+            return value
+    except TypeError:
+        return value
+    return cast_value(value, cast_to)
+
+
+def check_json_type(value, cast_to):
+    """
+    Raises a parser error if a JSON value cannot be cast without losing
+    information: `bool` only accepts booleans, numbers do not accept booleans
+    and `int` does not accept fractions. Strings are cast like argv.
+    """
+    kind = type(value).__name__
+    if cast_to is bool and not isinstance(value, bool):
+        raise ParseArgvError(f"expected a boolean, got {kind}")
+    if cast_to is str and not isinstance(value, str) and kind not in ("int", "float"):
+        raise ParseArgvError(f"expected a string, got {kind}")
+    if cast_to in (int, float) and isinstance(value, bool):
+        raise ParseArgvError(f"expected a number, got {kind}")
+    if cast_to is int and isinstance(value, float) and not value.is_integer():
+        raise ParseArgvError(f"expected an integer, got {value}")
+
+
+def get_json_codec():
+    """Returns functions to load and dump JSON, using `orjson` if it is installed."""
+    # pylint: disable=import-outside-toplevel,no-member
+    try:
+        import orjson
+
+        return orjson.loads, lambda obj: orjson.dumps(obj, default=str).decode()
+    except ImportError:
+        import json
+
+        return json.loads, partial(json.dumps, default=str)
+
+
+CACHE_SIZE = 64 << 20
+
+
+def cached(max_size=CACHE_SIZE, ttl=None, files=()):
+    """
+    Marks a command to memoize its output and return value on disk.
+    The cache of a module holds at most `max_size` bytes, entries expire after
+    `ttl` seconds and the contents of the files passed to the parameters named
+    in `files` are part of the cache key.
+    """
+
+    def decorator(function):
+        function.__magicli_cache__ = {"max_size": max_size, "ttl": ttl, "files": files}
+        return function
+
+    return decorator
+
+
+def call_cached(function, args, kwargs, options):
+    """
+    Returns the cached output and return value of a function call or calls the
+    function and caches them. The entry is keyed by the function's qualified
+    name, its arguments, the source of its module and the contents of input files.
+    An alias keyed by the raw argv lets `replay_cached` skip importing the module,
+    unless input files are part of the key.
+    `options['cache']` holds the CLI module and raw argv.
+    """
+    module, argv = options.get("cache", (None, ()))
+    settings = {"max_size": CACHE_SIZE, "ttl": None, "files": ()}
+    settings.update(getattr(function, "__magicli_cache__", {}))
+    name = module.__name__ if module else function.__module__
+    directory = get_cache_dir("results", name)
+
+    try:
+        key = get_cache_key(function, args, kwargs, settings["files"])
+    except Exception:  # pylint: disable=broad-exception-caught
+        return function(*args, **kwargs)
+
+    if entry := read_cache_entry(directory / f"{key}.pickle"):
+        sys.stdout.write(entry["output"])
+    else:
+        with redirect_stdout(tee := Tee(sys.stdout)):
+            result = function(*args, **kwargs)
+        entry = {
+            "output": "".join(tee.parts),
+            "result": result,
+            "expires": None
+            if settings["ttl"] is None
+            else time.time() + settings["ttl"],
+        }
+        if not write_cache_entry(directory, key, entry, settings["max_size"]):
+            return result
+
+    if not settings["files"] and (origin := getattr(module, "__file__", None)):
+        alias = directory / f"{get_alias_key(name, argv)}.alias"
+        write_alias(alias, get_alias_stamp(name, origin), key)
+    return entry["result"]
+
+
+def write_alias(path, stamp, key):
+    """Points an alias to a cache entry, unless it already does for this stamp."""
+    content = f"{stamp}\n{key}"
+    try:
+        if path.read_text(encoding="utf-8") == content:
+            return
+    except OSError:
+        pass
+    write_atomic(path, content.encode())
+
+
+class Tee:
+    """Writes to a stream and keeps a copy of everything written."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text):
+        """Writes text to the stream and keeps a copy."""
+        self.parts.append(text)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def replay_cached(name, argv):
+    """
+    Writes the cached output of argv without importing the module and returns
+    whether it was found. Costs a single `stat` if the module has no cache and
+    an `open` if argv has no alias. The module's source is only hashed to
+    check that an existing alias is still valid.
+    """
+    if not (directory := get_cache_dir("results", name)).is_dir():
+        return False
+    normalized = [argv[0].replace("-", "_"), *argv[1:]] if argv else argv
+    for candidate in (argv, normalized):
+        try:
+            alias = directory / f"{get_alias_key(name, candidate)}.alias"
+            stamp, _, key = alias.read_text(encoding="utf-8").partition("\n")
+        except OSError:
+            continue
+        try:
+            origin = importlib.util.find_spec(name).origin
+        except (AttributeError, ImportError, ValueError):
+            return False
+        if stamp == get_alias_stamp(name, origin) and (
+            entry := read_cache_entry(directory / f"{key}.pickle")
+        ):
+            sys.stdout.write(entry["output"])
+            return True
+    return False
+
+
+def get_cache_key(function, args, kwargs, files):
+    """Hashes a function call together with its module's source and input files."""
+    import hashlib  # pylint: disable=import-outside-toplevel
+    import pickle  # pylint: disable=import-outside-toplevel
+
+    arguments = inspect.signature(function).bind(*args, **kwargs).arguments
+    digest = hashlib.sha256(
+        pickle.dumps(
+            (function.__module__, function.__qualname__, sorted(arguments.items()))
+        )
+    )
+    origin = getattr(sys.modules.get(function.__module__), "__file__", None)
+    digest.update(hash_files(get_source_files(origin)).encode())
+    for parameter in files:
+        if (path := arguments.get(parameter)) and Path(path).is_file():
+            digest.update(hash_files([Path(path)]).encode())
+    return digest.hexdigest()
+
+
+def get_alias_key(name, argv):
+    """Hashes the raw argv of a module."""
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    return hashlib.sha256("\0".join([name, *argv]).encode()).hexdigest()
+
+
+def get_alias_stamp(name, origin):
+    """
+    Returns the hash of the module's source and the state of its config files
+    and environment variables that an alias is valid for.
+    """
+    _, stamp = get_config_stamp(name)
+    return hash_files(get_source_files(origin)) + repr(stamp)
+
+
+def hash_files(paths):
+    """Returns a hash of the names and contents of files."""
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path).encode() + b"\0" + path.read_bytes())
+    return digest.hexdigest()
+
+
+def read_cache_entry(path):
+    """Returns an unexpired cache entry and marks it as recently used."""
+    import pickle  # pylint: disable=import-outside-toplevel
+
+    try:
+        entry = pickle.loads(path.read_bytes())
+        os.utime(path)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if entry["expires"] is not None and entry["expires"] < time.time():
+        return None
+    return entry
+
+
+def write_cache_entry(directory, key, entry, max_size):
+    """
+    Writes a cache entry and evicts the least recently used entries until
+    the cache is smaller than `max_size`. Returns whether the entry was written.
+    """
+    import pickle  # pylint: disable=import-outside-toplevel
+
+    try:
+        data = pickle.dumps(entry)
+    except Exception:  # pylint: disable=broad-exception-caught
+        return False
+    directory.mkdir(parents=True, exist_ok=True)
+    write_atomic(directory / f"{key}.pickle", data)
+
+    entries = []
+    for path in directory.glob("*.pickle"):
+        try:
+            entries.append((path.stat(), path))
+        except FileNotFoundError:
+            continue
+    size = sum(stat.st_size for stat, _ in entries)
+    for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime_ns):
+        if size <= max_size:
+            break
+        path.unlink(missing_ok=True)
+        size -= stat.st_size
+    return True
+
+
+def write_atomic(path, data):
+    """Writes bytes to a temporary file and moves it in place to avoid partial files."""
+    import tempfile  # pylint: disable=import-outside-toplevel
+
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(data)
+    os.replace(file.name, path)
+
+
+def get_cache_dir(*parts):
+    """
+    Returns a path in magicli's cache directory, which is set by
+    `MAGICLI_CACHE_DIR` or defaults to `XDG_CACHE_HOME/magicli`.
+    """
+    if root := os.getenv("MAGICLI_CACHE_DIR"):
+        return Path(root, *parts)
+    return Path(
+        os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache", "magicli", *parts
+    )
+
+
+def find_variadic(parameters, options):
+    """
+    Returns the position of the variadic positional parameter if its items are
+    sharded or checkpointed. Records of `--magicli-map` and `--magicli-ndjson`
+    are used as items instead.
+    """
+    if not ITEM_OPTIONS & options.keys() or "map" in options or "ndjson" in options:
+        return None
+    for index, parameter in enumerate(parameters.values()):
+        if parameter.kind is parameter.VAR_POSITIONAL:
+            return index
+    option = min(ITEM_OPTIONS & options.keys()).replace("_", "-")
+    raise ParseArgvError(
+        f"--magicli-{option}: requires *args, --magicli-map or --magicli-ndjson"
+    )
+
+
+def call_items(function, args, kwargs, options):
+    """
+    Calls the function with the variadic positional arguments that are in the
+    shard and not done yet. With a checkpoint, the function is called once per
+    item like `--magicli-map`, so that each item is marked as done when it returns.
+    """
+    variadic = find_variadic(inspect.signature(function).parameters, options)
+    with open_checkpoint(function, args[:variadic], kwargs, options) as checkpoint:
+        items = select_items(args[variadic:], options, checkpoint)
+        if not checkpoint:
+            return function(*args[:variadic], *(item for _, item in items), **kwargs)
+        for index, item in items:
+            function(*args[:variadic], item, **kwargs)
+            checkpoint.add(index)
+    return None
+
+
+def select_items(items, options, checkpoint=None):
+    """
+    Lazily yields the index and item of the items in shard K of N selected by
+    `--magicli-shard K/N` that are not done according to the checkpoint.
+    Items are assigned by their CRC-32, which is stable across Python versions
+    and processes, or by their position with `--magicli-shard-by index`.
+    """
+    shard, count = options.get("shard", (0, 1))
+    by_index = options.get("shard_by") == "index"
+    for index, item in enumerate(items):
+        if count > 1 and (
+            (index if by_index else zlib.crc32(str(item).encode())) % count != shard
+        ):
+            continue
+        if checkpoint and index in checkpoint:
+            continue
+        yield index, item
+
+
+@contextmanager
+def open_checkpoint(function, args, kwargs, options):
+    """
+    Opens the checkpoint of a function call with `--magicli-checkpoint` or
+    `--magicli-resume`. It is keyed by the function, its arguments other than
+    the items and the options that select the items.
+    """
+    if not (options.get("checkpoint") or options.get("resume")):
+        yield None
+        return
+    import hashlib  # pylint: disable=import-outside-toplevel
+
+    key = repr(
+        [
+            function.__module__,
+            function.__qualname__,
+            args,
+            sorted(kwargs.items()),
+            [options.get(option) for option in ("map", "null", "ndjson", "shard")],
+            options.get("shard_by"),
+        ]
+    )
+    path = get_cache_dir(
+        "checkpoints", f"{hashlib.sha256(key.encode()).hexdigest()}.ckpt"
+    )
+    checkpoint = Checkpoint(path, resume=bool(options.get("resume")))
+    try:
+        yield checkpoint
+    finally:
+        checkpoint.close()
+
+
+class Checkpoint:
+    """
+    Records the indices of finished items in an append-only file of 8-byte
+    integers. Each record is a single unbuffered `write`, so finished items
+    survive a killed process. Finished items are looked up in a bitmap of one
+    bit per item.
+    """
+
+    record = struct.Struct("<Q")
+
+    def __init__(self, path, resume=False):
+        self.done = bytearray()
+        if resume and path.exists():
+            with path.open("rb") as file:
+                while chunk := file.read(self.record.size << 16):
+                    end = len(chunk) - len(chunk) % self.record.size
+                    for (index,) in self.record.iter_unpack(chunk[:end]):
+                        self.mark(index)
+            # Drops a partial record left by a crash, so that appends stay aligned.
+            os.truncate(
+                path, path.stat().st_size // self.record.size * self.record.size
+            )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | (0 if resume else os.O_TRUNC)
+        self.fd = os.open(path, flags, 0o644)
+
+    def __contains__(self, index):
+        byte = index >> 3
+        return byte < len(self.done) and bool(self.done[byte] >> (index & 7) & 1)
+
+    def mark(self, index):
+        """Marks an item as done in the bitmap."""
+        if (byte := index >> 3) >= len(self.done):
+            self.done.extend(bytes(max(byte + 1 - len(self.done), len(self.done))))
+        self.done[byte] |= 1 << (index & 7)
+
+    def add(self, index):
+        """Marks an item as done and appends it to the checkpoint file."""
+        self.mark(index)
+        os.write(self.fd, self.record.pack(index))
+
+    def close(self):
+        """Closes the checkpoint file."""
+        os.close(self.fd)
+
+
+def parse_shard(value):
+    """Parses a shard 'K/N' with 1 <= K <= N into a zero-based index and N."""
+    shard, count = map(int, value.split("/"))
+    if not 1 <= shard <= count:
+        raise ValueError(f"{value}: shard must be between 1/N and N/N")
+    return shard - 1, count
+
+
+def parse_shard_by(value):
+    """Validates the method of assigning items to shards."""
+    if value not in ("hash", "index"):
+        raise ValueError(f"{value}: shard by 'hash' or 'index'")
+    return value
+
+
+def parse_size(value):
+    """Converts a size like '512M' or '2G' into bytes."""
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    value = value.strip().upper().removesuffix("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+@contextmanager
+def usage_report(path):
+    """
+    Reports wall, user and system time, peak RSS and garbage collections
+    to stderr, or to a JSON file if a path is given.
+    """
+    import resource  # pylint: disable=import-outside-toplevel
+
+    start = time.perf_counter()
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    collections = [stats["collections"] for stats in gc.get_stats()]
+    try:
+        yield
+    finally:
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        usage = {
+            "wall": time.perf_counter() - start,
+            "user": after.ru_utime - before.ru_utime,
+            "sys": after.ru_stime - before.ru_stime,
+            "max_rss": after.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+            "gc": [
+                stats["collections"] - count
+                for stats, count in zip(gc.get_stats(), collections)
+            ],
+        }
+        if path is True:
+            print(format_usage(usage), file=sys.stderr)
+        else:
+            import json  # pylint: disable=import-outside-toplevel
+
+            Path(path).write_text(json.dumps(usage) + "\n", encoding="utf-8")
+
+
+def format_usage(usage):
+    """Formats resource usage as a single line."""
+    return (
+        f"wall {usage['wall']:.3f}s  user {usage['user']:.3f}s  sys {usage['sys']:.3f}s  "
+        f"max-rss {usage['max_rss'] / (1 << 20):.1f}M  "
+        f"gc {'/'.join(map(str, usage['gc']))}"
+    )
+
+
+@contextmanager
+def memory_limit(max_bytes):
+    """Limits the address space of the process to `max_bytes` using `RLIMIT_AS`."""
+    import resource  # pylint: disable=import-outside-toplevel
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+    try:
+        yield
+    except MemoryError:
+        raise SystemExit(f"error: memory limit of {max_bytes} bytes exceeded")
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
 
+@contextmanager
+def time_limit(seconds):
+    """Cancels the wrapped code with `SIGALRM` if it runs longer than `seconds`."""
 
-def parse_argv(argv, parameters, docstring):
-    """Convert argv into args and kwargs."""
+    def alarm(*_):
+        raise TimeLimitExceeded
+
+    previous = signal.signal(signal.SIGALRM, alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    except TimeLimitExceeded:
+        raise SystemExit(f"error: timeout of {seconds:g}s exceeded")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# Maps option names to their type, the context they run the function in and
+# the runner that calls the function. A type of `None` makes the option a flag
+# with an optional inline value. The first enabled option with a runner wins.
+MAGICLI_OPTIONS = {
+    "usage": (None, usage_report, None),
+    "max_memory": (parse_size, memory_limit, None),
+    "timeout": (float, time_limit, None),
+    "ndjson": (None, None, map_ndjson),
+    "map": (str, None, map_records),
+    "null": (None, None, None),
+    "flush": (int, None, None),
+    "shard": (parse_shard, None, call_items),
+    "shard_by": (parse_shard_by, None, None),
+    "checkpoint": (None, None, call_items),
+    "resume": (None, None, call_items),
+    "cache": (None, None, call_cached),
+}
+
+# Options that select the items of variadic positional arguments.
+ITEM_OPTIONS = {"shard", "checkpoint", "resume"}
+
+FLAG_VALUES = {
+    **dict.fromkeys(("1", "true", "yes", "on"), True),
+    **dict.fromkeys(("0", "false", "no", "off"), False),
+}
+
+
+def parse_argv(argv, parameters, docstring, require_all=True):
+    """
+    Convert argv into args and kwargs.
+    Positional arguments may be missing if `require_all` is false.
+    """
     parameter_list = list(parameters.values())
     args, kwargs = [], {}
 
@@ -93,16 +1099,28 @@ def parse_argv(argv, parameters, docstring):
             kwargs[left] = right
         elif key.startswith("-"):
             parse_short_options(key[1:], docstring, iter_argv, parameters, kwargs)
-        elif (index := len(args)) >= len(parameter_list):
+        elif (parameter := get_positional(parameter_list, len(args))) is None:
             raise ParseArgvError(f"{key}: unknown command")
         else:
-            args.append(cast_value(key, get_type(parameter_list[index])))
+            args.append(cast_value(key, get_type(parameter)))
 
-    check_all_args_present(len(args), parameter_list)
+    if require_all:
+        check_all_args_present(len(args), parameter_list)
 
     return args, kwargs
 
 
+def get_positional(parameter_list, index):
+    """
+    Returns the parameter of the positional argument at `index`.
+    A variadic positional parameter takes all remaining arguments.
+    """
+    for i, parameter in enumerate(parameter_list):
+        if i == index or (i < index and parameter.kind is parameter.VAR_POSITIONAL):
+            return parameter
+    return None
+
+
 def check_all_args_present(len_args, parameter_list):
     """
     If the first keyword argument does not have a default value,
@@ -110,7 +1128,10 @@ def check_all_args_present(len_args, parameter_list):
     """
     if len_args < len(parameter_list):
         parameter = parameter_list[len_args]
-        if parameter.default is parameter.empty:
+        if (
+            parameter.default is parameter.empty
+            and parameter.kind is not parameter.VAR_POSITIONAL
+        ):
             raise ParseArgvError(
                 f"{parameter.name}: positional argument missing"
             )
@@ -120,13 +1141,21 @@ def parse_kwarg(key, argv, parameters):
     """
     Parses a single keyword argument from command-line arguments.
     Handles '=' syntax for inline values. Casts `NoneType` values to `True`
-    and boolean values to `not default`.
+    and boolean values to `not default`, or to an explicit `--flag=false`.
+    Unambiguous prefixes of long options are completed unless `MAGICLI_STRICT`
+    is set.
     """
     key, value = key.split("=", 1) if "=" in key else (key, None)
     key = key.replace("-", "_")
 
-    if (parameter := parameters.get(key)) is None:
-        raise ParseArgvError(f"--{key}: unknown long option")
+    if key not in parameters:
+        trie = build_trie(tuple(parameters))
+        if os.getenv("MAGICLI_STRICT") or not (completed := complete(trie, key)):
+            raise ParseArgvError(
+                f"--{key}: unknown long option" + did_you_mean(trie, key, "--")
+            )
+        key = completed
+    parameter = parameters[key]
 
     cast_to = get_type(parameter)
 
@@ -136,10 +1165,20 @@ def parse_kwarg(key, argv, parameters):
         if cast_to is type(None):
             return key, True
         value = next_arg(argv)
+    elif cast_to is bool:
+        return key, cast_flag(value)
 
     return key, cast_value(value, cast_to)
 
 
+def cast_flag(value):
+    """Casts the explicit value of a boolean flag like `--verbose=false`."""
+    try:
+        return FLAG_VALUES[value.lower()]
+    except KeyError:
+        raise ParseArgvError(f"{value}: expected true or false") from None
+
+
 def next_arg(argv):
     """Return the next command-line argument or raise a parser error."""
     try:
@@ -205,7 +1244,10 @@ def check_for_help_and_version(argv, parameters, docstring, module, function):
     if not module or len(argv) != 1:
         return
     if argv[0] in ("--help", "-h") and "help" not in parameters:
-        logger.info(help_message(help_from_function, function, None, module))
+        message = help_message(help_from_function, function, None, module)
+        if module.__name__ != __name__ and (defaults := get_defaults(module, function)):
+            message += "\n\n" + format_defaults(parameters, defaults)
+        logger.info(message)
         raise SystemExit
     args = {
         "--version": "--version",
@@ -217,6 +1259,149 @@ def check_for_help_and_version(argv, parameters, docstring, module, function):
         raise SystemExit
 
 
+def apply_defaults(module, function, parameters, args, kwargs):
+    """
+    Adds the defaults from config files and environment variables to kwargs.
+    Parameters missing from `parameters`, like a mapped or piped one, are skipped.
+    """
+    bound = list(parameters)[: len(args)]
+    for key, (value, _) in get_defaults(module, function).items():
+        if key in parameters and key not in bound:
+            kwargs.setdefault(key, value)
+
+
+def get_defaults(module, function):
+    """
+    Returns the defaults of a function's optional parameters from config files
+    and `<CLI>_<PARAM>` environment variables, mapped to their value and source.
+    The cast defaults are cached until a config file or variable changes.
+    """
+    import pickle  # pylint: disable=import-outside-toplevel
+
+    configs, stamp = get_config_stamp(module.__name__)
+    if not any(stamp):
+        return {}
+    if configs and get_toml_loads() is None:
+        warn_unreadable_configs(module.__name__, configs)
+        configs = []
+
+    signature = inspect.signature(function)
+    stamp.append(str(signature))
+    cache = get_cache_dir("defaults", f"{module.__name__}.pickle")
+    try:
+        entries = pickle.loads(cache.read_bytes())
+    except (OSError, pickle.UnpicklingError, EOFError):
+        entries = {}
+    if (entry := entries.get(function.__qualname__)) and entry[0] == stamp:
+        return entry[1]
+
+    defaults = load_defaults(
+        module.__name__, function.__name__, signature.parameters, configs
+    )
+    entries[function.__qualname__] = (stamp, defaults)
+    try:
+        data = pickle.dumps(entries)
+    except Exception:  # pylint: disable=broad-exception-caught
+        return defaults
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(cache, data)
+    except OSError:
+        pass
+    return defaults
+
+
+def get_config_stamp(name):
+    """
+    Returns the existing config files of a CLI and a stamp of them and of the
+    `<NAME>_*` environment variables, which changes whenever a default may change.
+    """
+    prefix = name.upper().replace("-", "_") + "_"
+    configs = [path for path in get_config_paths(name) if path.is_file()]
+    env = sorted(item for item in os.environ.items() if item[0].startswith(prefix))
+    stamps = [
+        [str(path), path.stat().st_mtime_ns, path.stat().st_size] for path in configs
+    ]
+    return configs, [stamps, env]
+
+
+def warn_unreadable_configs(name, configs):
+    """Warns about config files that cannot be read without a TOML parser."""
+    for path in configs:
+        text = path.read_text(encoding="utf-8")
+        if path.name != "pyproject.toml" or f"[tool.{name}" in text:
+            logger.warning(
+                "%s: ignored, reading TOML requires Python 3.11 or tomli", path
+            )
+
+
+def get_config_paths(name):
+    """
+    Returns the config files of a CLI in increasing precedence: the user's
+    `<name>.toml` and the `[tool.<name>]` table of pyproject.toml.
+    """
+    config_home = Path(os.getenv("XDG_CONFIG_HOME") or Path.home() / ".config")
+    return [config_home / f"{name}.toml", Path("pyproject.toml")]
+
+
+def load_defaults(name, command, parameters, configs):
+    """
+    Reads and casts the defaults of optional parameters from config files and
+    environment variables. Tables named after a command only apply to it.
+    """
+    defaults = {}
+    for path in configs:
+        table = read_toml(path)
+        if path.name == "pyproject.toml":
+            table = table.get("tool", {}).get(name, {})
+        for key, value in [*table.items(), *table.get(command, {}).items()]:
+            parameter = parameters.get(key.replace("-", "_"))
+            if parameter and parameter.default is not parameter.empty:
+                source = str(path)
+                value = cast_default(value, get_type(parameter), source, cast_json)
+                defaults[parameter.name] = (value, source)
+
+    prefix = name.upper().replace("-", "_") + "_"
+    for parameter in parameters.values():
+        variable = prefix + parameter.name.upper()
+        if parameter.default is not parameter.empty and variable in os.environ:
+            source = f"${variable}"
+            value = cast_default(
+                os.environ[variable], get_type(parameter), source, cast_env
+            )
+            defaults[parameter.name] = (value, source)
+    return defaults
+
+
+def cast_default(value, cast_to, source, cast):
+    """Casts a default value and names its source if that fails."""
+    try:
+        return cast(value, cast_to)
+    except ParseArgvError as exc:
+        raise ParseArgvError(f"{source}: {exc.args[0] if exc.args else value}")
+
+
+def cast_env(value, cast_to):
+    """Casts the value of an environment variable, accepting '0' or 'false' for flags."""
+    if cast_to in (bool, type(None)):
+        enabled = value.strip().lower() not in ("", "0", "false", "no", "off")
+        return enabled if cast_to is bool else enabled or None
+    return cast_value(value, cast_to)
+
+
+def format_defaults(parameters, defaults):
+    """Formats the effective defaults of optional parameters and where they come from."""
+    lines = [
+        f"--{parameter.name.replace('_', '-')}={value!r} ({source})"
+        for parameter in parameters.values()
+        if parameter.default is not parameter.empty
+        for value, source in [
+            defaults.get(parameter.name, (parameter.default, "default"))
+        ]
+    ]
+    return format_blocks([["defaults:", *lines]])
+
+
 def help_message(help_function, obj, *args, error=None):
     """
     Generates a help message for a function or module.
@@ -274,15 +1459,358 @@ def load_module(name):
         raise SystemExit(f"{name}: command not found") from exc
 
 
+def watch(module, argv, name, interval=0.2):
+    """
+    Runs argv and runs it again whenever a source file of the module changes.
+    Only the module is reloaded, its dependencies stay imported.
+    """
+    try:
+        while True:
+            mtimes = get_mtimes(module)
+            dispatch_safely(argv, module, name)
+            wait_for_change(module, mtimes, interval)
+            reload_module(module)
+    except KeyboardInterrupt:
+        pass
+
+
+def dispatch_safely(argv, module, name):
+    """
+    Dispatches argv and prints help messages and tracebacks instead of exiting,
+    so that the module stays loaded for the next command.
+    """
+    try:
+        dispatch(argv, module, name)
+    except SystemExit as exc:
+        if isinstance(exc.code, str):
+            logger.info(exc.code)
+    except Exception:  # pylint: disable=broad-exception-caught
+        traceback.print_exc()
+
+
+def wait_for_change(module, mtimes, interval):
+    """Polls the modification times of the module's source files until they change."""
+    while get_mtimes(module) == mtimes:
+        time.sleep(interval)
+
+
+def get_mtimes(module):
+    """Returns the modification times of the module's source files."""
+    return {
+        path: path.stat().st_mtime_ns
+        for path in get_source_files(getattr(module, "__file__", None))
+        if path.exists()
+    }
+
+
+def get_source_files(origin):
+    """Returns the source file of a module or all source files of a package."""
+    if not origin:
+        return []
+    path = Path(origin)
+    return sorted(path.parent.rglob("*.py")) if path.name == "__init__.py" else [path]
+
+
+def reload_module(module):
+    """
+    Reloads a module after removing its submodules from `sys.modules`, so that
+    they are imported again in dependency order. If that fails, the previous
+    submodules are restored and the error is printed, so that the next change
+    can fix it.
+    """
+    get_command_trie.cache_clear()
+    prefix = module.__name__ + "."
+    submodules = {
+        name: sys.modules.pop(name)
+        for name in [name for name in sys.modules if name.startswith(prefix)]
+    }
+    try:
+        importlib.reload(module)
+    except Exception:  # pylint: disable=broad-exception-caught
+        for name, submodule in submodules.items():
+            sys.modules.setdefault(name, submodule)
+        traceback.print_exc()
+
+
+def shell(module, name, timing=False):
+    """
+    Reads commands from a prompt and dispatches them to the imported module
+    until end of input or `exit`. The history is kept in the cache directory
+    and tab completes commands and long options. Prints the duration of each
+    command if `timing` is true.
+    """
+    import shlex  # pylint: disable=import-outside-toplevel
+
+    history = setup_readline(module, name)
+    try:
+        while (line := read_line(f"{name}> ")) is not None:
+            try:
+                argv = shlex.split(line)
+            except ValueError as exc:
+                logger.info("error: %s", exc)
+                continue
+            if not argv:
+                continue
+            if argv == ["exit"] and not get_command(module, "exit"):
+                break
+            start = time.perf_counter()
+            try:
+                dispatch_safely(argv, module, name)
+            except KeyboardInterrupt:
+                print()
+            if timing:
+                logger.info(format_duration(time.perf_counter() - start))
+    finally:
+        if history:
+            history()
+
+
+def read_line(prompt):
+    """Reads a line from the prompt. Returns None at end of input."""
+    while True:
+        try:
+            return input(prompt)
+        except KeyboardInterrupt:
+            print()
+        except EOFError:
+            print()
+            return None
+
+
+def setup_readline(module, name):
+    """
+    Loads the shell history and enables tab completion if `readline` is available.
+    Returns a function that saves the history.
+    """
+    try:
+        import readline  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+
+    path = get_cache_dir("history", name)
+    try:
+        readline.read_history_file(path)
+    except OSError:
+        pass
+
+    def completer(text, state):
+        matches = complete_line(module, name, readline.get_line_buffer(), text)
+        return matches[state] if state < len(matches) else None
+
+    readline.set_completer_delims(" \t\n")
+    readline.set_completer(completer)
+    readline.parse_and_bind("tab: complete")
+
+    def save():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        readline.set_history_length(1000)
+        readline.write_history_file(path)
+
+    return save
+
+
+def complete_line(module, name, line, text, limit=100):
+    """
+    Returns the commands that complete `text` as first word of a shell line,
+    or the long options of the line's command that complete `text`.
+    """
+    words = line.split()
+    if text.startswith("--"):
+        function = is_command(words, module) or getattr(module, name, None)
+        if not inspect.isfunction(function):
+            return []
+        trie = build_trie(tuple(inspect.signature(function).parameters))
+        prefix = text[2:].replace("-", "_")
+        return ["--" + option for option in format_names(trie, prefix, limit)]
+    if len(words) <= 1 and not line.endswith(" "):
+        return format_names(get_command_trie(module), text.replace("-", "_"), limit)
+    return []
+
+
+def format_names(trie, prefix, limit):
+    """Returns the names in the trie that start with `prefix` as typed in argv."""
+    return [name.replace("_", "-") for name in find_prefixed(trie, prefix, limit)]
+
+
+METRICS_HEADER = struct.Struct("<dfffqiHH")
+
+
+@contextmanager
+def record_metrics(name):
+    """
+    Collects the phase timings, exit status and peak RSS of a CLI invocation
+    and appends them to the metrics log of the CLI.
+    """
+    metrics = {"import": 0.0, "parse": 0.0, "commands": [], "version": ""}
+    start = time.perf_counter()
+    status = 0
+    try:
+        yield metrics
+    except SystemExit as exc:
+        status = exc.code if isinstance(exc.code, int) else int(exc.code is not None)
+        raise
+    except KeyboardInterrupt:
+        status = 130
+        raise
+    except BaseException:
+        status = 1
+        raise
+    finally:
+        metrics["run"] = (
+            time.perf_counter() - start - metrics["import"] - metrics["parse"]
+        )
+        write_metrics(name, metrics, status)
+
+
+def write_metrics(name, metrics, status):
+    """
+    Appends a binary record to the metrics log. A single `write` to a file
+    opened with `O_APPEND` keeps records of concurrent processes intact.
+    """
+    import resource  # pylint: disable=import-outside-toplevel
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    command = " ::: ".join(metrics["commands"]).encode()[:0xFFFF]
+    version = metrics["version"].encode()[:0xFFFF]
+    record = METRICS_HEADER.pack(
+        time.time(),
+        metrics["import"],
+        metrics["parse"],
+        metrics["run"],
+        max_rss * (1 if sys.platform == "darwin" else 1024),
+        status,
+        len(command),
+        len(version),
+    )
+    (path := get_cache_dir("metrics", f"{name}.log")).parent.mkdir(
+        parents=True, exist_ok=True
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, record + command + version)
+    finally:
+        os.close(fd)
+
+
+def read_metrics(path):
+    """Yields the records of a metrics log as dicts."""
+    data = path.read_bytes()
+    offset = 0
+    while offset + METRICS_HEADER.size <= len(data):
+        (
+            timestamp,
+            import_time,
+            parse,
+            run,
+            max_rss,
+            status,
+            command_length,
+            version_length,
+        ) = METRICS_HEADER.unpack_from(data, offset)
+        offset += METRICS_HEADER.size
+        command = data[offset : offset + command_length].decode()
+        offset += command_length
+        version = data[offset : offset + version_length].decode()
+        offset += version_length
+        yield {
+            "time": timestamp,
+            "import": import_time,
+            "parse": parse,
+            "run": run,
+            "max_rss": max_rss,
+            "status": status,
+            "command": command,
+            "version": version,
+        }
+
+
+def percentile(values, percent):
+    """Returns the nearest-rank percentile of sorted values."""
+    return values[max(0, min(len(values), -(-len(values) * percent // 100)) - 1)]
+
+
+def stats(name=""):
+    """
+    Reports latency percentiles of recorded invocations per command and version.
+    Record invocations with `--magicli-metrics` or by setting `MAGICLI_METRICS`.
+
+    usage:
+      magicli stats [name]
+    """
+    paths = (
+        [get_cache_dir("metrics", f"{name}.log")]
+        if name
+        else sorted(get_cache_dir("metrics").glob("*.log"))
+    )
+    groups = {}
+    for path in paths:
+        if path.exists():
+            for record in read_metrics(path):
+                key = (path.stem, record["command"], record["version"])
+                groups.setdefault(key, []).append(record)
+
+    if not groups:
+        raise SystemExit("No metrics recorded")
+
+    rows = [
+        [
+            "command",
+            "version",
+            "runs",
+            "errors",
+            "p50",
+            "p95",
+            "p99",
+            "import",
+            "parse",
+            "run",
+            "rss",
+        ]
+    ]
+    for (cli_name, command, version), records in sorted(groups.items()):
+        total = sorted(r["import"] + r["parse"] + r["run"] for r in records)
+        rows.append(
+            [
+                f"{cli_name} {command}".strip(),
+                version or "-",
+                str(len(records)),
+                str(sum(r["status"] != 0 for r in records)),
+                *(format_duration(percentile(total, p)) for p in (50, 95, 99)),
+                *(
+                    format_duration(percentile(sorted(r[phase] for r in records), 50))
+                    for phase in ("import", "parse", "run")
+                ),
+                f"{max(r['max_rss'] for r in records) / (1 << 20):.1f}M",
+            ]
+        )
+    widths = [max(map(len, column)) for column in zip(*rows)]
+    for row in rows:
+        logger.info(
+            "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        )
+
+
+def format_duration(seconds):
+    """Formats a duration in milliseconds."""
+    return f"{seconds * 1000:.1f}ms"
+
+
 def get_commands(module):
-    """Returns list of public commands that are not excluded by `__all__`."""
-    return [
+    """
+    Returns list of public commands that are not excluded by `__all__`,
+    followed by plugin commands if the module has no default function.
+    """
+    commands = [
         name
         for name, _ in inspect.getmembers(module, inspect.isfunction)
         if not name.startswith("_")
         and name in getattr(module, "__all__", [name])
         and name != module.__name__
     ]
+    if has_default_function(module):
+        return commands
+    plugins = sorted(set(get_plugins(module.__name__)).difference(commands))
+    return commands + plugins
 
 
 def get_version(module):
@@ -371,6 +1899,9 @@ def cli(name="", author="", email="", description="", homepage=""):
 
     usage:
       magicli [option]
+      magicli stats [name]
+      magicli startup [option]
+      magicli bundle [option]
 
     options:
       --name
@@ -438,3 +1969,383 @@ def cli(name="", author="", email="", description="", homepage=""):
 
     pyproject.write_text(format_blocks(blocks, sep="\n") + "\n", encoding="utf-8")
     logger.debug("Created pyproject.toml ✨")
+
+
+def startup(runs=5, args="--help", output="startup.json", baseline="", top=10):
+    """
+    Measures the startup time of the project's CLI and ranks its slowest imports.
+    The first run starts without bytecode cache, the others are warm runs.
+    Imports that only some commands use are listed as candidates for deferral.
+    Results are saved as JSON and compared to a previous `--baseline` file.
+
+    usage:
+      magicli startup [option]
+
+    options:
+      --runs
+      --args
+      --output
+      --baseline
+      --top
+    """
+    import json  # pylint: disable=import-outside-toplevel
+
+    name = get_project_name()
+    timings, imports = measure_startup(name, args, max(runs, 2))
+    results = {
+        "name": name,
+        "args": args,
+        "cold": timings[0],
+        "warm": sorted(timings[1:])[len(timings[1:]) // 2],
+        "attribution": attribute_imports(imports, name),
+        "imports": [
+            {key: node[key] for key in ("name", "self", "cumulative")}
+            for node in sorted(imports, key=lambda node: -node["cumulative"])[:top]
+        ],
+        "deferrable": find_deferrable_imports(name, imports),
+    }
+    logger.info(format_startup(results, imports, top))
+
+    if baseline:
+        previous = json.loads(Path(baseline).read_text(encoding="utf-8"))
+        for key in ("cold", "warm"):
+            logger.info(
+                "%s %s -> %s (%+.1f%%)",
+                key,
+                format_duration(previous[key]),
+                format_duration(results[key]),
+                (results[key] / previous[key] - 1) * 100,
+            )
+
+    Path(output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+def measure_startup(name, args, runs):
+    """
+    Runs a CLI with `-X importtime` and returns the wall time of each run and the
+    imports of the last run. The bytecode cache starts empty for the first run.
+    The installed script is run with `runpy`, falling back to `magicli()` if
+    the project is not installed. magicli and the module are imported with
+    import statements first, in the order the script imports them, because
+    `-X importtime` does not report `importlib.import_module`.
+    """
+    import shlex  # pylint: disable=import-outside-toplevel
+    import shutil  # pylint: disable=import-outside-toplevel
+    import tempfile  # pylint: disable=import-outside-toplevel
+
+    if script := shutil.which(name):
+        argv = [script, *shlex.split(args)]
+        run = f"import runpy; runpy.run_path({script!r}, run_name='__main__')"
+    else:
+        argv = [name, *shlex.split(args)]
+        run = "magicli.magicli()"
+    code = f"import sys; sys.argv = {argv!r}; import magicli; import {name}; {run}"
+    timings, stderr = [], ""
+    with tempfile.TemporaryDirectory() as prefix:
+        env = {**os.environ, "PYTHONPYCACHEPREFIX": prefix}
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        for _ in range(runs):
+            start = time.perf_counter()
+            stderr = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", code],
+                capture_output=True,
+                text=True,
+                env=env,
+                check=False,
+            ).stderr
+            timings.append(time.perf_counter() - start)
+    return timings, parse_importtime(stderr)
+
+
+def format_startup(results, imports, top):
+    """Formats the startup times, slowest imports, attribution and deferrable imports."""
+    blocks = [
+        [
+            f"cold {format_duration(results['cold'])}  warm {format_duration(results['warm'])}"
+        ],
+        ["slowest imports:", *format_import_tree(imports, top)],
+        [
+            "attribution:",
+            *(
+                f"{k} {format_duration(v / 1e6)}"
+                for k, v in results["attribution"].items()
+            ),
+        ],
+    ]
+    if results["deferrable"]:
+        blocks.append(["deferrable imports:"])
+        for module, info in results["deferrable"].items():
+            commands = ", ".join(info["commands"]) or "unused"
+            duration = format_duration(info["cumulative"] / 1e6)
+            blocks[-1].append(f"{module} {duration}: {commands}")
+    return format_blocks(blocks)
+
+
+def parse_importtime(stderr):
+    """
+    Parses the output of `python -X importtime` into a list of all imports.
+    Each import has a list of its `children`, which are printed before it.
+    """
+    imports, pending = [], {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        node = {
+            "name": name.strip(),
+            "self": int(own),
+            "cumulative": int(cumulative),
+            "children": pending.pop(depth + 1, []),
+        }
+        pending.setdefault(depth, []).append(node)
+        imports.append(node)
+    return imports
+
+
+def format_import_tree(imports, top, depth=3):
+    """Formats the slowest top-level imports and their slowest children as a tree."""
+    children = {id(child) for node in imports for child in node["children"]}
+    roots = [node for node in imports if id(node) not in children]
+
+    def lines(nodes, level):
+        for node in sorted(nodes, key=lambda node: -node["cumulative"])[:top]:
+            yield f"{'  ' * level}{node['name']} {format_duration(node['cumulative'] / 1e6)}"
+            if level + 1 < depth:
+                yield from lines(node["children"], level + 1)
+
+    return list(lines(roots, 0))
+
+
+def attribute_imports(imports, name):
+    """Sums the self time of the imports of the user module, magicli, stdlib and others."""
+    totals = {"user": 0, "magicli": 0, "stdlib": 0, "third-party": 0}
+    for node in imports:
+        package = node["name"].split(".")[0]
+        if package == name:
+            totals["user"] += node["self"]
+        elif package == "magicli":
+            totals["magicli"] += node["self"]
+        elif package in sys.stdlib_module_names or package.startswith("_"):
+            totals["stdlib"] += node["self"]
+        else:
+            totals["third-party"] += node["self"]
+    return totals
+
+
+def find_deferrable_imports(name, imports=()):
+    """
+    Returns the top-level imports of a module that are not used at module level
+    and not by every command, with the commands using them and their import time.
+    """
+    import ast  # pylint: disable=import-outside-toplevel
+
+    try:
+        origin = importlib.util.find_spec(name).origin
+        tree = ast.parse(Path(origin).read_text(encoding="utf-8"))
+    except (AttributeError, ImportError, OSError, SyntaxError, TypeError, ValueError):
+        return {}
+
+    imported, commands, module_level = {}, {}, set()
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            for alias in statement.names:
+                bound = alias.asname or alias.name.split(".")[0]
+                if isinstance(statement, ast.Import):
+                    imported[bound] = alias.name
+                else:
+                    imported[bound] = statement.module or ""
+        elif isinstance(statement, ast.FunctionDef) and not statement.name.startswith(
+            "_"
+        ):
+            commands[statement.name] = {
+                node.id for node in ast.walk(statement) if isinstance(node, ast.Name)
+            }
+        else:
+            module_level.update(
+                node.id for node in ast.walk(statement) if isinstance(node, ast.Name)
+            )
+
+    cumulative = {node["name"]: node["cumulative"] for node in imports}
+    deferrable = {}
+    for bound, module in imported.items():
+        users = [command for command, names in commands.items() if bound in names]
+        if bound not in module_level and len(users) < len(commands):
+            deferrable[module] = {
+                "commands": users,
+                "cumulative": cumulative.get(module, 0),
+            }
+    return dict(sorted(deferrable.items(), key=lambda item: -item[1]["cumulative"]))
+
+
+def bundle(output="", directory=False):
+    """
+    Bundles the project's module, magicli and the pinned dependencies into an
+    executable zipapp in `dist/<name>.pyz`, or a directory `dist/<name>` that
+    is run by its `run` script with `--directory`. The bundle contains
+    precompiled bytecode and runs with `python -I -S`, which skips `site`.
+    Dependencies with C extensions require a directory bundle.
+
+    usage:
+      magicli bundle [option]
+
+    options:
+      --output
+      --directory
+    """
+    import compileall  # pylint: disable=import-outside-toplevel
+    import shutil  # pylint: disable=import-outside-toplevel
+    import tempfile  # pylint: disable=import-outside-toplevel
+    import zipapp  # pylint: disable=import-outside-toplevel
+
+    try:
+        project = read_toml("pyproject.toml").get("project", {})
+    except ImportError as exc:
+        raise SystemExit(exc.args[0])
+    name = project.get("name") or get_project_name()
+    if not (source := find_module_source(name)):
+        raise SystemExit(f"{name}: module not found")
+    output = Path(output or Path("dist", name if directory else f"{name}.pyz"))
+    check_bundle_output(output, source, directory)
+
+    with tempfile.TemporaryDirectory() as build:
+        if source.is_dir():
+            shutil.copytree(
+                source, Path(build, name), ignore=shutil.ignore_patterns("__pycache__")
+            )
+        else:
+            shutil.copy(source, build)
+        shutil.copy(__file__, build)
+        if requirements := pin_requirements(project.get("dependencies", [])):
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "pip",
+                    "install",
+                    "--target",
+                    build,
+                    *requirements,
+                ],
+                check=True,
+            )
+        Path(build, "__main__.py").write_text(
+            "import os, sys\n"
+            "sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))\n"
+            f"sys.argv[0] = {name!r}\n"
+            "from magicli import magicli\n"
+            "magicli()\n",
+            encoding="utf-8",
+        )
+        compileall.compile_dir(build, quiet=1, legacy=not directory)
+
+        if directory:
+            shutil.rmtree(output, ignore_errors=True)
+            shutil.copytree(build, output)
+            Path(output, BUNDLE_MARKER).write_text(name, encoding="utf-8")
+            launcher = output / "run"
+            launcher.write_text(
+                f'#!/bin/sh\nexec "{sys.executable}" -I -S "$(dirname "$0")" "$@"\n',
+                encoding="utf-8",
+            )
+        else:
+            output.parent.mkdir(parents=True, exist_ok=True)
+            zipapp.create_archive(build, output, interpreter=f"{sys.executable} -IS")
+            launcher = output
+    launcher.chmod(launcher.stat().st_mode | 0o111)
+    logger.debug("Created %s ✨", launcher)
+
+
+# Marks a directory bundle, which `bundle` may replace.
+BUNDLE_MARKER = ".magicli-bundle"
+
+
+def check_bundle_output(output, source, directory):
+    """
+    Refuses to write a bundle to or around the source, or to replace anything
+    but a previous bundle.
+    """
+    import zipfile  # pylint: disable=import-outside-toplevel
+
+    resolved, source = output.resolve(), source.resolve()
+    if resolved == source or resolved in source.parents or source in resolved.parents:
+        raise SystemExit(f"{output}: overlaps with the source {source}")
+    if output.exists() and (
+        not (output / BUNDLE_MARKER).is_file()
+        if directory
+        else not zipfile.is_zipfile(output)
+    ):
+        raise SystemExit(f"{output}: exists and is not a bundle")
+
+
+def read_toml(path):
+    """
+    Returns the contents of a TOML file or an empty dict if it does not exist
+    or is invalid. Raises ImportError if neither Python 3.11 nor `tomli`
+    is available to read it.
+    """
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    if (loads := get_toml_loads()) is None:
+        raise ImportError(f"{path}: reading TOML requires Python 3.11 or tomli")
+    try:
+        return loads(text)
+    except ValueError:
+        return {}
+
+
+def get_toml_loads():
+    """Returns the function to parse TOML, using `tomli` before Python 3.11, or None."""
+    # pylint: disable=import-outside-toplevel
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return None
+    return tomllib.loads
+
+
+def find_module_source(name):
+    """Returns the source file or package directory of a module in the project."""
+    for path in [Path(f"{name}.py"), Path(name), Path("src", name)]:
+        if (path.suffix == ".py" and path.is_file()) or (
+            path / "__init__.py"
+        ).is_file():
+            return path
+    return None
+
+
+def pin_requirements(dependencies):
+    """
+    Pins the dependencies to their installed versions, except for magicli.
+    Extras and environment markers are kept, direct references are not pinned.
+    """
+    import re  # pylint: disable=import-outside-toplevel
+
+    pinned = []
+    for dependency in dependencies:
+        match = re.match(
+            r"\s*([A-Za-z0-9._-]+)\s*(\[[^\]]*\])?([^;]*)(;.*)?", dependency
+        )
+        distribution, extras, specifier, marker = match.groups(default="")
+        if distribution.lower() == "magicli":
+            continue
+        if "@" in specifier:
+            pinned.append(dependency)
+            continue
+        try:
+            version = metadata.version(distribution)
+        except metadata.PackageNotFoundError:
+            pinned.append(dependency)
+            continue
+        marker = f"; {marker[1:].strip()}" if marker else ""
+        pinned.append(f"{distribution}{extras.replace(' ', '')}=={version}{marker}")
+    return pinned
+
+
+# Subcommands of the `magicli` CLI itself. Any other argv is passed to `cli`.
+MAGICLI_COMMANDS = {"stats": stats, "startup": startup, "bundle": bundle}
@@ -0,0 +1,116 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from fixtures import empty_directory, with_tempdir
+
+from magicli import bundle, find_module_source, pin_requirements
+
+SOURCE = """\
+import sys
+
+def module(name="world"):
+    print("hello", name, "site" in sys.modules)
+"""
+
+
+@pytest.fixture
+def project(with_tempdir):
+    Path(with_tempdir, "module.py").write_text(SOURCE)
+    Path(with_tempdir, "pyproject.toml").write_text(
+        '[project]\nname = "module"\ndependencies = ["magicli<3"]\n'
+    )
+    return Path(with_tempdir)
+
+
+def test_bundle_zipapp(project):
+    bundle()
+    output = subprocess.run(
+        [str(project / "dist" / "module.pyz"), "--name", "zip"],
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output == "hello zip False\n"
+
+
+def test_bundle_directory(project):
+    for _ in range(2):
+        bundle(directory=True)
+    assert (project / "dist" / "module" / "module.py").exists()
+    assert list((project / "dist" / "module" / "__pycache__").glob("module.*.pyc"))
+    output = subprocess.run(
+        [str(project / "dist" / "module" / "run"), "--name", "dir"],
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output == "hello dir False\n"
+
+
+def test_bundle_package(with_tempdir):
+    package = Path(with_tempdir, "mytool")
+    package.mkdir()
+    (package / "__init__.py").write_text("def mytool():\n    print('package')\n")
+    Path(with_tempdir, "pyproject.toml").write_text('[project]\nname = "mytool"\n')
+    bundle(directory=True)
+    assert (package / "__init__.py").exists()
+    output = subprocess.run(
+        [str(Path(with_tempdir, "dist", "mytool", "run"))],
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output == "package\n"
+
+
+@pytest.mark.parametrize("output", [".", "module.py", "other"])
+def test_bundle_does_not_overwrite(project, output):
+    (project / "other").mkdir()
+    (project / "other" / "data.txt").touch()
+    with pytest.raises(SystemExit):
+        bundle(output=output, directory=output != "module.py")
+    assert (project / "module.py").read_text() == SOURCE
+    assert (project / "other" / "data.txt").exists()
+
+
+def test_find_module_source(with_tempdir):
+    assert find_module_source("module") == Path("module.py")
+    Path(with_tempdir, "src", "package").mkdir(parents=True)
+    Path(with_tempdir, "src", "package", "__init__.py").touch()
+    assert find_module_source("package") == Path("src", "package")
+    assert find_module_source("missing") is None
+
+
+def test_bundle_without_module(empty_directory):
+    Path("pyproject.toml").write_text('[project]\nname = "missing"\n')
+    with pytest.raises(SystemExit) as error:
+        bundle()
+    assert error.value.code == "missing: module not found"
+
+
+def test_bundle_without_toml_parser(project):
+    with mock.patch("magicli.get_toml_loads", return_value=None):
+        with pytest.raises(SystemExit) as error:
+            bundle()
+    assert error.value.code == (
+        "pyproject.toml: reading TOML requires Python 3.11 or tomli"
+    )
+
+
+def test_pin_requirements():
+    assert pin_requirements(["magicli<3", "pytest>=1", "not-installed>1"]) == [
+        f"pytest=={pytest.__version__}",
+        "not-installed>1",
+    ]
+    version = pytest.__version__
+    assert pin_requirements(
+        [
+            "pytest[testing] >=1",
+            'pytest>=1; python_version < "4"',
+            "pytest @ https://example.com/pytest.whl",
+        ]
+    ) == [
+        f"pytest[testing]=={version}",
+        f'pytest=={version}; python_version < "4"',
+        "pytest @ https://example.com/pytest.whl",
+    ]
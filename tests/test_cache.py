@@ -0,0 +1,136 @@
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from magicli import (
+    cached,
+    call,
+    call_cached,
+    get_cache_key,
+    magicli,
+    replay_cached,
+)
+
+calls = []
+
+
+def report(n: int, path=""):
+    calls.append(n)
+    print("report", n)
+    return n * 2
+
+
+@cached(ttl=0)
+def expiring():
+    calls.append(None)
+
+
+@cached(max_size=60)
+def small(n: int):
+    calls.append(n)
+    return n
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+@pytest.fixture
+def cached_module(tmp_path, monkeypatch):
+    (tmp_path / "cachedtool.py").write_text(
+        "import magicli\n"
+        "@magicli.cached()\n"
+        "def cachedtool(n: int):\n"
+        "    print('cached', n)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    sys.modules.pop("cachedtool", None)
+
+
+def test_cached_marks_function():
+    assert expiring.__magicli_cache__ == {"max_size": 64 << 20, "ttl": 0, "files": ()}
+
+
+def test_cache_flag(capsys):
+    for _ in range(2):
+        assert call(report, ["1", "--magicli-cache"]) == 2
+    assert call(report, ["2", "--magicli-cache"]) == 4
+    assert calls == [1, 2]
+    assert capsys.readouterr().out == "report 1\nreport 1\nreport 2\n"
+
+
+def test_cache_expires():
+    call(expiring, [])
+    call(expiring, [])
+    assert calls == [None, None]
+
+
+def test_cache_evicts_least_recently_used(cache_dir):
+    for n in [1, 2, 1]:
+        call_cached(small, (n,), {}, {})
+    assert calls == [1, 2, 1]
+    assert len(list(Path(cache_dir, "results", __name__).glob("*.pickle"))) == 1
+
+
+def test_cache_key_includes_files(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("a")
+    key = get_cache_key(report, (1,), {"path": str(path)}, ["path"])
+    assert key == get_cache_key(report, (1,), {"path": str(path)}, ["path"])
+    path.write_text("b")
+    assert key != get_cache_key(report, (1,), {"path": str(path)}, ["path"])
+
+
+def test_uncacheable_arguments_are_not_cached(cache_dir):
+    assert call_cached(report, (1,), {"path": lambda: None}, {}) == 2
+    assert not Path(cache_dir).exists()
+
+
+def test_cache_hit_skips_import(cached_module, capsys):
+    sys.argv = ["cachedtool", "3"]
+    magicli()
+    with mock.patch("importlib.import_module", side_effect=ImportError):
+        magicli()
+    assert capsys.readouterr().out == "cached 3\ncached 3\n"
+
+
+@pytest.fixture
+def files_module(tmp_path, monkeypatch):
+    (tmp_path / "filestool.py").write_text(
+        "import magicli\n"
+        "@magicli.cached(files=['path'])\n"
+        "def filestool(path):\n"
+        "    print(open(path).read())\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path / "in.txt"
+    sys.modules.pop("filestool", None)
+
+
+def test_cache_with_files_is_not_replayed(files_module, capsys):
+    sys.argv = ["filestool", str(files_module)]
+    files_module.write_text("one")
+    magicli()
+    files_module.write_text("two")
+    magicli()
+    assert capsys.readouterr().out == "one\ntwo\n"
+
+
+def test_replay_without_alias_skips_hashing(cached_module, capsys):
+    sys.argv = ["cachedtool", "3"]
+    magicli()
+    with mock.patch("magicli.hash_files", side_effect=AssertionError):
+        assert not replay_cached("cachedtool", ["4"])
+
+
+def test_replay_checks_source(cached_module, tmp_path, capsys):
+    sys.argv = ["cachedtool", "3"]
+    magicli()
+    (tmp_path / "cachedtool.py").write_text(
+        "def cachedtool(n: int):\n    print('changed', n)\n"
+    )
+    assert not replay_cached("cachedtool", ["3"])
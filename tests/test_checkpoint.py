@@ -0,0 +1,93 @@
+import io
+
+import pytest
+
+from magicli import Checkpoint, call
+
+processed = []
+
+
+def process(prefix, *items: int, fail: int = -1):
+    for item in items:
+        if item == fail:
+            raise RuntimeError(item)
+        processed.append(item)
+
+
+def fetch(item: int, fail: int = -1):
+    if item == fail:
+        raise RuntimeError(item)
+    processed.append(item)
+
+
+@pytest.fixture(autouse=True)
+def clear_processed():
+    processed.clear()
+
+
+def test_checkpoint_bitmap(tmp_path):
+    path = tmp_path / "checkpoint"
+    checkpoint = Checkpoint(path)
+    for index in [0, 9, 1000]:
+        checkpoint.add(index)
+    checkpoint.close()
+    with path.open("ab") as file:
+        file.write(b"\x01\x02")
+
+    checkpoint = Checkpoint(path, resume=True)
+    assert [index for index in range(1001) if index in checkpoint] == [0, 9, 1000]
+    assert 10**9 not in checkpoint
+    checkpoint.add(5)
+    checkpoint.close()
+    assert 5 in Checkpoint(path, resume=True)
+    assert Checkpoint(path).done == bytearray()
+
+
+def test_checkpoint_writes_each_record(tmp_path):
+    path = tmp_path / "checkpoint"
+    checkpoint = Checkpoint(path)
+    checkpoint.add(3)
+    assert path.read_bytes() == Checkpoint.record.pack(3)
+    checkpoint.close()
+
+
+def test_resume_stdin_records(monkeypatch):
+    argv = ["--magicli-map", "item", "--fail", "3", "--magicli-checkpoint"]
+    monkeypatch.setattr("sys.stdin", io.StringIO("1\n2\n3\n4\n"))
+    with pytest.raises(RuntimeError):
+        call(fetch, argv)
+    assert processed == [1, 2]
+
+    argv[-1] = "--magicli-resume"
+    monkeypatch.setattr("sys.stdin", io.StringIO("1\n2\n3\n4\n"))
+    with pytest.raises(RuntimeError):
+        call(fetch, argv)
+    assert processed == [1, 2]
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("1\n2\n3\n4\n"))
+    call(fetch, ["--magicli-map", "item", "--magicli-resume"])
+    assert processed == [1, 2, 1, 2, 3, 4]
+
+
+def test_resume_variadic_positionals():
+    call(process, ["a", "1", "2", "--magicli-checkpoint"])
+    call(process, ["a", "1", "2", "3", "--magicli-resume"])
+    call(process, ["b", "1", "--magicli-resume"])
+    assert processed == [1, 2, 3, 1]
+
+
+def test_resume_failed_variadic_positionals():
+    argv = ["a", "1", "2", "3", "4", "--fail", "3", "--magicli-checkpoint"]
+    with pytest.raises(RuntimeError):
+        call(process, argv)
+    assert processed == [1, 2]
+    argv[-1] = "--magicli-resume"
+    with pytest.raises(RuntimeError):
+        call(process, argv)
+    assert processed == [1, 2]
+
+
+def test_checkpoint_requires_items():
+    with pytest.raises(SystemExit) as error:
+        call(fetch, ["1", "--magicli-resume"])
+    assert error.value.code.startswith("--magicli-resume: requires *args")
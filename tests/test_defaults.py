@@ -0,0 +1,151 @@
+import io
+import os
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from fixtures import empty_directory
+
+from magicli import call, cast_env, get_toml_loads, magicli
+
+requires_toml = pytest.mark.skipif(
+    get_toml_loads() is None, reason="reading TOML requires Python 3.11 or tomli"
+)
+
+PYPROJECT = """\
+[tool.tool]
+level = 3
+name = "config"
+unknown = 1
+
+[tool.tool.other]
+level = "4"
+"""
+
+
+def command(level=1, name="", verbose=False):
+    return level, name, verbose
+
+
+def other(level=1):
+    return level
+
+
+@pytest.fixture
+def module(empty_directory, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    Path("pyproject.toml").write_text(PYPROJECT)
+    module = type(sys)("tool")
+    module.command = command
+    module.other = other
+    return module
+
+
+@requires_toml
+def test_defaults_from_pyproject(module):
+    assert call(command, [], module) == (3, "config", False)
+    assert call(other, [], module) == 4
+
+
+@requires_toml
+def test_defaults_precedence(module, tmp_path, monkeypatch):
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "tool.toml").write_text("name = 'user'\nverbose = true\n")
+    assert call(command, [], module) == (3, "config", True)
+    monkeypatch.setenv("TOOL_LEVEL", "5")
+    monkeypatch.setenv("TOOL_VERBOSE", "false")
+    assert call(command, [], module) == (5, "config", False)
+    assert call(command, ["--level", "6"], module) == (6, "config", False)
+    assert call(command, ["7"], module) == (7, "config", False)
+    monkeypatch.setenv("TOOL_VERBOSE", "1")
+    assert call(command, ["--verbose"], module) == (5, "config", True)
+    assert call(command, ["--verbose=false"], module) == (5, "config", False)
+    assert call(command, ["--verbose=True"], module) == (5, "config", True)
+
+
+@requires_toml
+def test_defaults_are_cached(module):
+    call(command, [], module)
+    with mock.patch("magicli.read_toml", side_effect=AssertionError):
+        assert call(command, [], module) == (3, "config", False)
+    Path("pyproject.toml").write_text("[tool.tool]\nlevel = 8\n")
+    os.utime("pyproject.toml", ns=(0, 0))
+    assert call(command, [], module) == (8, "", False)
+
+
+@requires_toml
+def test_defaults_without_mapped_or_piped_parameter(module, monkeypatch):
+    results = []
+
+    def record(level=1, name=""):
+        results.append((level, name))
+
+    call(record, [], module)
+    call(record, [], module, piped=2)
+    monkeypatch.setattr("sys.stdin", io.StringIO("mapped\n"))
+    call(record, ["--magicli-map", "name"], module)
+    call(record, [], module)
+    assert results == [(3, "config"), (2, "config"), (3, "mapped"), (3, "config")]
+
+
+def test_invalid_default(module, monkeypatch):
+    monkeypatch.setenv("TOOL_LEVEL", "high")
+    with pytest.raises(SystemExit) as error:
+        call(command, [], module)
+    assert error.value.code.startswith(
+        "$TOOL_LEVEL: invalid literal for int() with base 10: 'high'"
+    )
+
+
+@requires_toml
+def test_help_shows_sources(module, monkeypatch, caplog):
+    monkeypatch.setenv("TOOL_NAME", "env")
+    with pytest.raises(SystemExit):
+        call(command, ["--help"], module)
+    assert caplog.messages[0].endswith(
+        "defaults:\n"
+        "  --level=3 (pyproject.toml)\n"
+        "  --name='env' ($TOOL_NAME)\n"
+        "  --verbose=False (default)"
+    )
+
+
+def test_defaults_without_writable_cache(module, tmp_path, monkeypatch):
+    (tmp_path / "file").touch()
+    monkeypatch.setenv("MAGICLI_CACHE_DIR", str(tmp_path / "file" / "cache"))
+    monkeypatch.setenv("TOOL_LEVEL", "2")
+    assert call(command, [], module)[0] == 2
+
+
+def test_configs_without_toml_parser(module, monkeypatch, caplog):
+    monkeypatch.setenv("TOOL_NAME", "env")
+    with mock.patch("magicli.get_toml_loads", return_value=None):
+        assert call(command, [], module) == (1, "env", False)
+    assert caplog.messages == [
+        "pyproject.toml: ignored, reading TOML requires Python 3.11 or tomli"
+    ]
+
+
+def test_replay_depends_on_environment(empty_directory, tmp_path, monkeypatch, capsys):
+    (tmp_path / "envtool.py").write_text(
+        "import magicli\n"
+        "@magicli.cached()\n"
+        "def envtool(suffix=''):\n"
+        "    print('out' + suffix)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sys.argv = ["envtool"]
+    magicli()
+    monkeypatch.setenv("ENVTOOL_SUFFIX", "!")
+    magicli()
+    magicli()
+    sys.modules.pop("envtool", None)
+    assert capsys.readouterr().out == "out\nout!\nout!\n"
+
+
+def test_cast_env():
+    assert cast_env("2", int) == 2
+    assert cast_env("yes", bool) is True
+    assert cast_env("off", bool) is False
+    assert cast_env("0", type(None)) is None
@@ -0,0 +1,68 @@
+import json
+import resource
+import time
+
+import pytest
+
+from magicli import (
+    ParseArgvError,
+    call,
+    parse_size,
+    split_magicli_options,
+)
+
+
+def sleep(seconds: float):
+    time.sleep(seconds)
+    return "done"
+
+
+def address_space():
+    return resource.getrlimit(resource.RLIMIT_AS)[0]
+
+
+def test_split_magicli_options():
+    assert split_magicli_options(["a", "--b"]) == (["a", "--b"], {})
+    assert split_magicli_options(
+        ["a", "--magicli-timeout", "2", "--magicli-usage", "--magicli-max-memory=1K"]
+    ) == (["a"], {"timeout": 2.0, "usage": True, "max_memory": 1024})
+
+
+def test_unknown_magicli_option():
+    with pytest.raises(ParseArgvError) as error:
+        split_magicli_options(["--magicli-unknown"])
+    assert error.value.args[0] == "--magicli-unknown: unknown magicli option"
+
+
+@pytest.mark.parametrize(
+    ("size", "result"),
+    [("100", 100), ("2K", 2048), ("1.5m", 1572864), ("1GB", 1 << 30)],
+)
+def test_parse_size(size, result):
+    assert parse_size(size) == result
+
+
+def test_timeout():
+    with pytest.raises(SystemExit) as error:
+        call(sleep, ["1", "--magicli-timeout", "0.05"])
+    assert error.value.code == "error: timeout of 0.05s exceeded"
+    assert call(sleep, ["0", "--magicli-timeout=1"]) == "done"
+
+
+def test_max_memory():
+    limit = address_space()
+    assert call(address_space, ["--magicli-max-memory", "64G"]) == 1 << 36
+    assert address_space() == limit
+
+
+def test_usage_to_stderr(capsys):
+    assert call(sleep, ["0", "--magicli-usage"]) == "done"
+    assert capsys.readouterr().err.startswith("wall ")
+
+
+def test_usage_to_json_file(tmp_path):
+    path = tmp_path / "usage.json"
+    call(sleep, ["0", f"--magicli-usage={path}"])
+    usage = json.loads(path.read_text())
+    assert set(usage) == {"wall", "user", "sys", "max_rss", "gc"}
+    assert len(usage["gc"]) == 3
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from magicli import call, read_records
+
+results = []
+
+
+def fetch(prefix, id: int, suffix=""):
+    results.append(f"{prefix}{id}{suffix}")
+
+
+@pytest.fixture(autouse=True)
+def clear_results():
+    results.clear()
+
+
+def stdin(monkeypatch, text):
+    monkeypatch.setattr("sys.stdin", io.StringIO(text))
+
+
+def test_read_records():
+    assert list(read_records(io.StringIO("a\nb\n"))) == ["a", "b"]
+    assert list(read_records(io.StringIO("a\0b\0c"), "\0", size=3)) == ["a", "b", "c"]
+    assert list(read_records(io.StringIO(""), "\0")) == []
+
+
+def test_map(monkeypatch):
+    stdin(monkeypatch, "1\n2\n3\n")
+    call(fetch, ["--magicli-map", "id", "x", "--suffix", "!"])
+    assert results == ["x1!", "x2!", "x3!"]
+
+
+def test_map_first_positional_parameter(monkeypatch):
+    stdin(monkeypatch, "a\nb\n")
+    call(lambda prefix, id, /: fetch(prefix, id), ["--magicli-map=prefix", "1"])
+    assert results == ["a1", "b1"]
+
+
+def test_map_null_delimited(monkeypatch):
+    stdin(monkeypatch, "1\x002")
+    call(fetch, ["x", "--magicli-map=id", "--magicli-null", "--magicli-flush", "0"])
+    assert results == ["x1", "x2"]
+
+
+def test_map_unknown_parameter(monkeypatch):
+    stdin(monkeypatch, "1\n")
+    with pytest.raises(SystemExit) as error:
+        call(fetch, ["x", "--magicli-map", "unknown"])
+    assert error.value.code.startswith("unknown: unknown parameter to map")
+
+
+def test_map_invalid_record(monkeypatch):
+    stdin(monkeypatch, "1\nx\n")
+    with pytest.raises(SystemExit) as error:
+        call(fetch, ["x", "--magicli-map", "id"])
+    assert error.value.code == "x: invalid literal for int() with base 10: 'x'"
+    assert results == ["x1"]
@@ -0,0 +1,74 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+from magicli import magicli, percentile, read_metrics
+
+
+def command(n: int = 0):
+    pass
+
+
+def create_module(name):
+    module = type(sys)(name)
+    module.__version__ = "1.0"
+    module.command = command
+    return module
+
+
+@mock.patch("importlib.import_module", side_effect=create_module)
+def test_metrics_are_recorded(mocked, cache_dir):
+    sys.argv = ["tool", "command", "--magicli-metrics"]
+    magicli()
+    sys.argv = ["tool", "command", "--n", "x"]
+    with mock.patch.dict(os.environ, {"MAGICLI_METRICS": "1"}):
+        with pytest.raises(SystemExit):
+            magicli()
+
+    first, second = read_metrics(cache_dir / "metrics" / "tool.log")
+    assert first["command"] == "command"
+    assert first["version"] == "1.0"
+    assert first["status"] == 0
+    assert first["max_rss"] > 0
+    assert min(first["import"], first["parse"], first["run"]) >= 0
+    assert second["status"] == 1
+
+
+@mock.patch("importlib.import_module", side_effect=create_module)
+def test_no_metrics_by_default(mocked, cache_dir):
+    sys.argv = ["tool", "command"]
+    magicli()
+    assert not (cache_dir / "metrics").exists()
+
+
+@mock.patch("importlib.import_module", side_effect=create_module)
+def test_stats(mocked, caplog):
+    sys.argv = ["tool", "command", "--magicli-metrics"]
+    for _ in range(3):
+        magicli()
+    sys.argv = ["magicli", "stats"]
+    with pytest.raises(SystemExit) as error:
+        magicli()
+    assert error.value.code is None
+    header, row = caplog.messages
+    assert header.split() == [
+        "command", "version", "runs", "errors", "p50", "p95", "p99",
+        "import", "parse", "run", "rss",
+    ]  # fmt: skip
+    assert row.split()[:5] == ["tool", "command", "1.0", "3", "0"]
+
+
+def test_stats_without_metrics():
+    sys.argv = ["magicli", "stats", "tool"]
+    with pytest.raises(SystemExit) as error:
+        magicli()
+    assert error.value.code == "No metrics recorded"
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([1], 95) == 1
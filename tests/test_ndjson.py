@@ -0,0 +1,80 @@
+import inspect
+import io
+import json
+
+import pytest
+
+from magicli import ParseArgvError, bind_record, call, cast_json
+
+
+def add(a: int, b: float = 0.5, label=""):
+    return f"{label}{a + b}"
+
+
+def run(monkeypatch, capsys, text, argv=()):
+    monkeypatch.setattr("sys.stdin", io.StringIO(text))
+    call(add, [*argv, "--magicli-ndjson"])
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_cast_json():
+    assert cast_json("1", int) == 1
+    assert cast_json(1, float) == 1.0
+    assert cast_json(True, bool) is True
+    assert cast_json([1], list[int]) == [1]
+    assert cast_json("x", type(None)) == "x"
+    assert cast_json(5, str) == "5"
+    assert cast_json(0.5, str) == "0.5"
+    assert cast_json(2.0, int) == 2
+    for value in (True, None, [], {}):
+        with pytest.raises(ParseArgvError):
+            cast_json(value, str)
+
+
+@pytest.mark.parametrize(
+    ("value", "cast_to"),
+    [("false", bool), (0, bool), (1.9, int), (True, int), (False, float)],
+)
+def test_cast_json_rejects_lossy_values(value, cast_to):
+    with pytest.raises(ParseArgvError):
+        cast_json(value, cast_to)
+
+
+def test_ndjson_rejects_lossy_values(monkeypatch, capsys):
+    records = '{"a": 1.9}\n{"a": true}\n{"a": 2.0}\n'
+    assert run(monkeypatch, capsys, records) == [
+        {"error": "ParseArgvError: expected an integer, got 1.9"},
+        {"error": "ParseArgvError: expected a number, got bool"},
+        {"result": "2.5"},
+    ]
+
+
+def test_bind_record():
+    parameters = inspect.signature(add).parameters
+    assert bind_record({"b": "2"}, parameters, {"a": 1}) == {"a": 1, "b": 2.0}
+    with pytest.raises(ParseArgvError) as error:
+        bind_record([], parameters, {})
+    assert error.value.args[0] == "record is not a JSON object"
+
+
+def test_ndjson(monkeypatch, capsys):
+    records = '{"a": 1}\n\n{"a": "2", "b": 1}\n{"a": 1, "c": 2}\n{"b": 1}\n[\n'
+    *results, invalid = run(monkeypatch, capsys, records, ["--label", "="])
+    assert results == [
+        {"result": "=1.5"},
+        {"result": "=3.0"},
+        {"error": "ParseArgvError: c: unknown parameter"},
+        {"error": "ParseArgvError: a: positional argument missing"},
+    ]
+    assert invalid["error"].startswith("JSONDecodeError: ")
+
+
+def test_ndjson_from_file(tmp_path, capsys):
+    path = tmp_path / "records.ndjson"
+    path.write_text('{"a": 1, "b": 2}\n')
+    call(add, ["--magicli-ndjson=" + str(path), "--magicli-flush=0"])
+    assert json.loads(capsys.readouterr().out) == {"result": "3.0"}
+
+
+def test_ndjson_positional_from_argv(monkeypatch, capsys):
+    assert run(monkeypatch, capsys, '{"b": 1}\n', ["1"]) == [{"result": "2.0"}]
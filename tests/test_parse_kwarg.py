@@ -28,6 +28,25 @@ def test_parse_kwarg_bool_and_none(default, result):
     ) == ("kwarg", result)
 
 
+@pytest.mark.parametrize(
+    ("value", "result"),
+    [("false", False), ("0", False), ("No", False), ("true", True), ("on", True)],
+)
+def test_parse_kwarg_explicit_bool(value, result):
+    kwarg = Parameter("kwarg", PK, default=True)
+    assert parse_kwarg(f"kwarg={value}", iter([]), {"kwarg": kwarg}) == (
+        "kwarg",
+        result,
+    )
+
+
+def test_parse_kwarg_invalid_bool():
+    kwarg = Parameter("kwarg", PK, default=False)
+    with pytest.raises(ParseArgvError) as error:
+        parse_kwarg("kwarg=maybe", iter([]), {"kwarg": kwarg})
+    assert error.value.args[0] == "maybe: expected true or false"
+
+
 def test_get_type():
     assert get_type(Parameter("a", PK, annotation=int)) is int
     assert get_type(Parameter("b", PK, default=1)) is int
@@ -90,3 +109,11 @@ def test_parse_argv_with_invalid_type_raises_parse_error():
     with pytest.raises(ParseArgvError) as error:
         parse_argv(["not-an-int"], {"arg": Parameter("arg", PK, annotation=int)}, "")
     assert error.value.args[0] == "invalid literal for int() with base 10: 'not-an-int'"
+
+
+def test_parse_argv_with_variadic_positional():
+    parameters = inspect.signature(lambda a, *items: None).parameters
+    assert parse_argv(["a", "1", "2"], parameters, docstring="") == (["a", "1", "2"], {})
+    assert parse_argv(["a"], parameters, docstring="") == (["a"], {})
+    parameters = inspect.signature(lambda *items: None).parameters
+    assert parse_argv([], parameters, docstring="") == ([], {})
@@ -0,0 +1,76 @@
+import sys
+from unittest import mock
+
+import pytest
+
+from magicli import call, magicli
+
+consumed = []
+
+
+def numbers(n: int):
+    for i in range(n):
+        consumed.append(i)
+        yield i
+
+
+def scale(values, factor: int = 1):
+    for value in values:
+        yield value * factor
+
+
+def total(values, offset: int = 0):
+    return sum(values) + offset
+
+
+def nothing():
+    pass
+
+
+def create_module(name):
+    module = type(sys)(name)
+    for function in [numbers, scale, total, nothing]:
+        setattr(module, function.__name__, function)
+    return module
+
+
+@pytest.fixture(autouse=True)
+def clear_consumed():
+    consumed.clear()
+
+
+@mock.patch("importlib.import_module", side_effect=create_module)
+def test_pipeline(mocked, capsys):
+    sys.argv = ["tool", "numbers", "3", ":::", "scale", "--factor", "2", ":::", "total"]
+    magicli()
+    assert capsys.readouterr().out == "6\n"
+
+
+@mock.patch("importlib.import_module", side_effect=create_module)
+def test_pipeline_streams_generators(mocked, capsys):
+    sys.argv = ["tool", "numbers", "2", ":::", "scale", "--factor=3"]
+    magicli()
+    assert capsys.readouterr().out == "0\n3\n"
+
+
+@mock.patch("importlib.import_module", side_effect=create_module)
+def test_pipeline_errors(mocked):
+    sys.argv = ["tool", "numbers", "2", ":::", "nothing"]
+    with pytest.raises(SystemExit) as error:
+        magicli()
+    assert error.value.code.startswith("nothing: takes no piped input")
+    sys.argv = ["tool", "numbers", "2", ":::", "unknown"]
+    with pytest.raises(SystemExit):
+        magicli()
+
+
+def test_call_with_piped_value():
+    assert call(total, ["--offset", "1"], piped=[1, 2]) == 4
+    assert consumed == []
+
+
+def test_call_with_piped_value_and_variadic_args():
+    def concat(values, /, *extra, sep=""):
+        return sep.join([*map(str, values), *extra])
+
+    assert call(concat, ["a", "b", "--sep", "-"], piped=[1]) == "1-a-b"
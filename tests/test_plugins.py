@@ -0,0 +1,66 @@
+import json
+import sys
+from importlib import metadata
+from unittest import mock
+
+import pytest
+
+from magicli import get_commands, get_plugins, is_command
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    (site := tmp_path / "site").mkdir()
+    (site / "toolplugin.py").write_text("def extra(n: int):\n    return n + 1\n")
+    monkeypatch.syspath_prepend(str(site))
+    entry_points = [metadata.EntryPoint("extra-cmd", "toolplugin:extra", "tool.commands")]
+    get_plugins.cache_clear()
+    with mock.patch("importlib.metadata.entry_points", return_value=entry_points) as mocked:
+        yield mocked
+    get_plugins.cache_clear()
+    sys.modules.pop("toolplugin", None)
+
+
+def tool_module():
+    module = type(sys)("tool")
+    module.own = lambda: None
+    return module
+
+
+def test_plugin_command(plugin):
+    module = tool_module()
+    assert get_commands(module) == ["own", "extra_cmd"]
+    assert "toolplugin" not in sys.modules
+    assert is_command(["extra-cmd"], module)(1) == 2
+    assert is_command(["unknown"], module) is None
+
+
+def test_plugin_index_is_cached(plugin):
+    assert get_plugins("tool") == {"extra_cmd": "toolplugin:extra"}
+    get_plugins.cache_clear()
+    assert get_plugins("tool") == {"extra_cmd": "toolplugin:extra"}
+    plugin.assert_called_once_with(group="tool.commands")
+
+
+def test_plugin_index_is_rebuilt(plugin, cache_dir):
+    get_plugins("tool")
+    get_plugins.cache_clear()
+    with mock.patch("magicli.get_site_stamp", return_value=[["changed", 0]]):
+        get_plugins("tool")
+    assert plugin.call_count == 2
+    index = json.loads((cache_dir / "plugins" / "tool.json").read_text())
+    assert index["stamp"] == [["changed", 0]]
+
+
+def test_no_plugins_with_default_function(plugin):
+    module = tool_module()
+    module.tool = lambda value: value
+    assert is_command(["extra-cmd"], module) is None
+    assert get_commands(module) == ["own"]
+    plugin.assert_not_called()
+
+
+def test_plugin_index_without_writable_cache(plugin, tmp_path, monkeypatch):
+    (tmp_path / "file").touch()
+    monkeypatch.setenv("MAGICLI_CACHE_DIR", str(tmp_path / "file" / "cache"))
+    assert get_plugins("tool") == {"extra_cmd": "toolplugin:extra"}
@@ -0,0 +1,52 @@
+import io
+import zlib
+
+import pytest
+
+from magicli import ParseArgvError, call, parse_shard, select_items, split_magicli_options
+
+
+def process(prefix, *items: int):
+    return [f"{prefix}{item}" for item in items]
+
+
+def test_parse_shard():
+    assert parse_shard("1/4") == (0, 4)
+    assert parse_shard("4/4") == (3, 4)
+    for invalid in ["0/4", "5/4", "1", "a/b"]:
+        with pytest.raises(ValueError):
+            parse_shard(invalid)
+
+
+def test_select_items_by_hash_is_stable():
+    items = [str(i) for i in range(100)]
+    shards = [[i for _, i in select_items(items, {"shard": (k, 3)})] for k in range(3)]
+    assert sorted(sum(shards, [])) == sorted(items)
+    assert shards[0] == [i for i in items if zlib.crc32(i.encode()) % 3 == 0]
+
+
+def test_select_items_by_index():
+    options = {"shard": (1, 3), "shard_by": "index"}
+    assert list(select_items(iter("abcdefg"), options)) == [(1, "b"), (4, "e")]
+    assert list(select_items(iter("ab"), {})) == [(0, "a"), (1, "b")]
+
+
+def test_shard_variadic_positionals():
+    argv = ["x", *"012345", "--magicli-shard", "2/3", "--magicli-shard-by=index"]
+    assert call(process, argv) == ["x1", "x4"]
+
+
+def test_shard_stdin_records(monkeypatch):
+    results = []
+    monkeypatch.setattr("sys.stdin", io.StringIO("a\nb\nc\nd\n"))
+    argv = ["--magicli-map=item", "--magicli-shard=1/2", "--magicli-shard-by=index"]
+    call(lambda item: results.append(item), argv)
+    assert results == ["a", "c"]
+
+
+def test_shard_requires_items():
+    with pytest.raises(SystemExit) as error:
+        call(lambda a: a, ["1", "--magicli-shard", "1/2"])
+    assert error.value.code.startswith("--magicli-shard: requires *args")
+    with pytest.raises(ParseArgvError):
+        split_magicli_options(["--magicli-shard-by", "random"])
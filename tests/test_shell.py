@@ -0,0 +1,81 @@
+import logging
+import sys
+from unittest import mock
+
+import pytest
+
+from magicli import complete_line, get_command_trie, magicli, shell
+
+
+def greet(name, shout=False):
+    """usage: greet name [--shout]"""
+    logging.info(name.upper() if shout else name)
+
+
+def fail():
+    raise RuntimeError("failed")
+
+
+def tool_module():
+    module = type(sys)("tool")
+    module.greet = greet
+    module.fail = fail
+    return module
+
+
+@pytest.fixture(autouse=True)
+def clear_command_trie():
+    get_command_trie.cache_clear()
+    yield
+    get_command_trie.cache_clear()
+
+
+def run_shell(lines, timing=False):
+    with mock.patch("builtins.input", side_effect=[*lines, EOFError]):
+        shell(tool_module(), "tool", timing)
+
+
+def test_shell_runs_commands(caplog, capsys):
+    caplog.set_level(logging.INFO)
+    run_shell(["greet world", "", "greet 'a b' --shout", "exit", "greet never"])
+    assert caplog.messages == ["world", "A B"]
+
+
+def test_shell_survives_errors(caplog, capsys):
+    caplog.set_level(logging.INFO)
+    run_shell(["greet", "fail", "greet 'open", "greet after"])
+    assert caplog.messages[0].startswith("name: positional argument missing")
+    assert "RuntimeError: failed" in capsys.readouterr().err
+    assert caplog.messages[1].startswith("error: No closing quotation")
+    assert caplog.messages[-1] == "after"
+
+
+def test_shell_timing(caplog):
+    caplog.set_level(logging.INFO)
+    run_shell(["greet x"], timing=True)
+    assert caplog.messages[0] == "x"
+    assert caplog.messages[1].endswith("ms")
+
+
+def test_shell_history(cache_dir):
+    pytest.importorskip("readline")
+    run_shell(["greet x"])
+    assert (cache_dir / "history" / "tool").exists()
+
+
+def test_complete_line():
+    module = tool_module()
+    assert complete_line(module, "tool", "", "") == ["fail", "greet"]
+    assert complete_line(module, "tool", "gr", "gr") == ["greet"]
+    assert complete_line(module, "tool", "greet --s", "--s") == ["--shout"]
+    assert complete_line(module, "tool", "greet ", "") == []
+    assert complete_line(module, "tool", "unknown --s", "--s") == []
+
+
+@mock.patch("importlib.import_module", return_value=tool_module())
+@mock.patch("magicli.shell")
+def test_shell_option(shell_mock, mocked):
+    sys.argv = ["tool", "--magicli-shell", "--magicli-timing"]
+    with pytest.raises(SystemExit):
+        magicli()
+    shell_mock.assert_called_once_with(mocked.return_value, "tool", True)
@@ -0,0 +1,103 @@
+import json
+import os
+from pathlib import Path
+
+import magicli
+from fixtures import with_tempdir
+
+from magicli import attribute_imports, find_deferrable_imports, parse_importtime, startup
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:        10 |         10 |     b.c
+import time:        20 |         30 |   b
+import time:         5 |          5 |   magicli
+import time:        40 |         75 | module
+import time:         7 |          7 | json
+"""
+
+SOURCE = """\
+import json
+import os
+from pathlib import Path
+
+ROOT = Path()
+
+def module():
+    pass
+
+def dump():
+    json.dumps(os.sep)
+
+def load():
+    json.loads(os.sep)
+"""
+
+
+def test_parse_importtime():
+    imports = parse_importtime(IMPORTTIME)
+    assert [node["name"] for node in imports] == ["b.c", "b", "magicli", "module", "json"]
+    module = imports[3]
+    assert [child["name"] for child in module["children"]] == ["b", "magicli"]
+    assert module["children"][0]["children"] == [imports[0]]
+
+
+def test_attribute_imports():
+    assert attribute_imports(parse_importtime(IMPORTTIME), "module") == {
+        "user": 40,
+        "magicli": 5,
+        "stdlib": 7,
+        "third-party": 30,
+    }
+
+
+def test_find_deferrable_imports(with_tempdir, monkeypatch):
+    Path(with_tempdir, "module.py").write_text(SOURCE)
+    monkeypatch.syspath_prepend(with_tempdir)
+    imports = parse_importtime(IMPORTTIME)
+    assert find_deferrable_imports("module", imports) == {
+        "json": {"commands": ["dump", "load"], "cumulative": 7},
+        "os": {"commands": ["dump", "load"], "cumulative": 0},
+    }
+    assert find_deferrable_imports("missing") == {}
+
+
+def test_startup(with_tempdir, monkeypatch, caplog):
+    Path(with_tempdir, "module.py").write_text(SOURCE)
+    monkeypatch.syspath_prepend(with_tempdir)
+    monkeypatch.setenv("PYTHONPATH", str(Path(magicli.__file__).parent))
+    monkeypatch.setenv("PYTHONDONTWRITEBYTECODE", "1")
+    startup(runs=2, output="baseline.json")
+    startup(runs=2, baseline="baseline.json")
+
+    results = json.loads(Path("startup.json").read_text())
+    assert results["name"] == "module"
+    assert results["cold"] > 0 and results["warm"] > 0
+    assert results["attribution"]["magicli"] > 0
+    assert results["attribution"]["user"] > 0
+    assert "json" in results["deferrable"]
+    assert any(message.startswith("warm ") for message in caplog.messages)
+
+
+SCRIPT = """\
+import sys
+from pathlib import Path
+from magicli import magicli
+if __name__ == "__main__":
+    Path("ran").touch()
+    sys.exit(magicli())
+"""
+
+
+def test_startup_runs_installed_script(with_tempdir, tmp_path, monkeypatch):
+    Path(with_tempdir, "module.py").write_text(SOURCE)
+    (bin_dir := tmp_path / "bin").mkdir()
+    (script := bin_dir / "module").write_text(SCRIPT)
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PYTHONPATH", str(Path(magicli.__file__).parent))
+    startup(runs=2)
+
+    results = json.loads(Path("startup.json").read_text())
+    assert Path("ran").exists()
+    assert results["attribution"]["user"] > 0
@@ -0,0 +1,117 @@
+import inspect
+import sys
+
+import pytest
+
+from magicli import (
+    ParseArgvError,
+    build_trie,
+    complete,
+    did_you_mean,
+    dispatch,
+    find_similar,
+    get_command_trie,
+    is_command,
+    parse_argv,
+)
+
+
+def process(path, verbose=False, version=""):
+    return f"{path} {verbose}"
+
+
+def produce():
+    return "produced"
+
+
+def tool_module():
+    module = type(sys)("tool")
+    module.process = process
+    module.produce = produce
+    return module
+
+
+@pytest.fixture(autouse=True)
+def clear_command_trie():
+    get_command_trie.cache_clear()
+    yield
+    get_command_trie.cache_clear()
+
+
+def test_complete():
+    trie = build_trie(("process", "produce", "stats"))
+    assert complete(trie, "proc") == "process"
+    assert complete(trie, "s") == "stats"
+    assert complete(trie, "pro") is None
+    assert complete(trie, "x") is None
+    assert complete(trie, "stats") == "stats"
+
+
+def test_find_similar():
+    trie = build_trie(("process", "produce", "stats", "status"))
+    assert find_similar(trie, "procss", 1) == ["process"]
+    assert find_similar(trie, "statu", 1) == ["stats", "status"]
+    assert find_similar(trie, "xyz", 2) == []
+
+
+def test_did_you_mean():
+    trie = build_trie(("dry_run", "verbose"))
+    assert did_you_mean(trie, "dry_rnu", "--") == ", did you mean --dry-run?"
+    assert did_you_mean(trie, "quiet") == ""
+
+
+def test_command_prefix():
+    module = tool_module()
+    assert is_command(["proc"], module) is process
+    assert is_command(["pro"], module) is None
+
+
+def test_command_prefix_strict(monkeypatch):
+    monkeypatch.setenv("MAGICLI_STRICT", "1")
+    assert is_command(["proc"], tool_module()) is None
+
+
+def test_no_command_prefix_with_default_function():
+    module = tool_module()
+    module.tool = lambda name: name
+    assert is_command(["proc"], module) is None
+
+
+def test_unknown_command_suggestion():
+    with pytest.raises(SystemExit) as error:
+        dispatch(["prodcue"], tool_module(), "tool")
+    assert error.value.code.startswith(
+        "prodcue: unknown command, did you mean produce?\n\n"
+    )
+
+
+def test_long_option_prefix(monkeypatch):
+    parameters = inspect.signature(process).parameters
+    assert parse_argv(["a", "--verb"], parameters, "") == (["a"], {"verbose": True})
+    with pytest.raises(ParseArgvError) as error:
+        parse_argv(["a", "--ver"], parameters, "")
+    assert error.value.args[0] == (
+        "--ver: unknown long option, did you mean --verbose or --version?"
+    )
+    monkeypatch.setenv("MAGICLI_STRICT", "1")
+    with pytest.raises(ParseArgvError):
+        parse_argv(["a", "--verb"], parameters, "")
+
+
+def test_long_option_suggestion():
+    parameters = inspect.signature(process).parameters
+    with pytest.raises(ParseArgvError) as error:
+        parse_argv(["a", "--verbsoe"], parameters, "")
+    assert error.value.args[0] == (
+        "--verbsoe: unknown long option, did you mean --verbose?"
+    )
+
+
+def test_unknown_command_suggestion_with_default_function():
+    module = tool_module()
+    module.tool = lambda: None
+    with pytest.raises(SystemExit) as error:
+        dispatch(["procss"], module, "tool")
+    assert error.value.code.startswith(
+        "procss: unknown command, did you mean process?\n\n"
+    )
@@ -0,0 +1,86 @@
+import logging
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+from magicli import get_source_files, magicli, reload_module, wait_for_change, watch
+
+
+@pytest.fixture
+def watched_module(tmp_path, monkeypatch):
+    path = tmp_path / "watched.py"
+    path.write_text("import logging\ndef watched():\n    logging.info('v1')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield path
+    sys.modules.pop("watched", None)
+
+
+def edit(path, source):
+    path.write_text(source)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_get_source_files(tmp_path):
+    package = tmp_path / "package"
+    package.mkdir()
+    (package / "__init__.py").touch()
+    (package / "sub.py").touch()
+    assert get_source_files(None) == []
+    assert get_source_files(tmp_path / "a.py") == [tmp_path / "a.py"]
+    assert get_source_files(package / "__init__.py") == [
+        package / "__init__.py",
+        package / "sub.py",
+    ]
+
+
+def test_reload_package_in_dependency_order(tmp_path, monkeypatch):
+    package = tmp_path / "wp"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .b import run\n")
+    (package / "b.py").write_text("from .a import msg\ndef run():\n    return msg()\n")
+    (package / "a.py").write_text("def msg():\n    return 'v1'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr("sys.modules", dict(sys.modules))
+    import wp
+
+    assert wp.run() == "v1"
+    edit(package / "a.py", "def msg():\n    return 'v2'\n")
+    reload_module(wp)
+    assert wp.run() == "v2"
+    edit(package / "a.py", "def msg(:\n")
+    reload_module(wp)
+    assert sys.modules["wp.a"].msg() == "v2"
+
+
+def test_wait_for_change(watched_module):
+    module = type(sys)("watched")
+    module.__file__ = str(watched_module)
+    wait_for_change(module, {watched_module: 0}, interval=0)
+
+
+def test_watch_reloads_module(watched_module, caplog):
+    def change(*_):
+        if change.calls:
+            raise KeyboardInterrupt
+        change.calls += 1
+        edit(watched_module, "import logging\ndef watched():\n    logging.info('v2')\n")
+
+    change.calls = 0
+    sys.argv = ["watched", "--magicli-watch"]
+    with mock.patch("magicli.wait_for_change", side_effect=change):
+        with pytest.raises(SystemExit) as error:
+            magicli()
+    assert error.value.code is None
+    assert caplog.messages == ["v1", "v2"]
+
+
+def test_watch_survives_errors(watched_module, caplog):
+    module = type(sys)("watched")
+    module.watched = lambda: logging.info(1 / 0)
+    with mock.patch("magicli.wait_for_change", side_effect=KeyboardInterrupt):
+        watch(module, ["--unknown"], "watched")
+        watch(module, [], "watched")
+    assert caplog.messages[0].startswith("--unknown: unknown long option")